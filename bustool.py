@@ -1,23 +1,99 @@
 #!/usr/bin/env python3
 
-import parser, writer, sysverilog, sys, argparse
+import sys
+
+# Everything else is imported where it is used, so each run only loads the modules it needs.
 
 def make_writer(path: str):
+    import writer
     if path == '-':
         return writer.Writer(sys.stdout)
     else:
-        return writer.Writer(open(path), lambda x: x.fd.close())
+        return writer.Writer(open(path, "w"), lambda x: x.fd.close())
+
+def parse_defines(raw: list[str]) -> dict[str, int]:
+    defines = {}
+    for x in raw:
+        if '=' not in x:
+            raise ValueError(f"Expected NAME=VALUE, got {x}")
+        k, v = x.split('=', 1)
+        defines[k] = int(v, 0)
+    return defines
+
+def parse_sweep(raw: list[str], defines: dict[str, int]) -> list[dict[str, int]]:
+    import itertools
+    names  = []
+    values = []
+    for x in raw:
+        if '=' not in x:
+            raise ValueError(f"Expected NAME=VALUE,..., got {x}")
+        k, v = x.split('=', 1)
+        names.append(k)
+        values.append([int(i, 0) for i in v.split(',')])
+    return [dict(defines, **dict(zip(names, x))) for x in itertools.product(*values)]
 
-def run(outfile: str, srcfile: str):
+def run(outfile: str, srcfile: str, tb: bool = False):
+    import parser, sysverilog
+    if tb:
+        import testbench
     map = parser.parse_file(srcfile)
     with make_writer(outfile) as wr:
         for id in map:
             map[id].generate()
             sysverilog.build(wr, map, id)
+            if tb:
+                testbench.build(wr, map, id)
+
+def run_latency(outfile: str, srcfile: str, chain: list[str], defines: dict[str, int]):
+    import parser, latency
+    map = parser.parse_file(srcfile)
+    for id in chain:
+        map[id].generate()
+    with make_writer(outfile) as wr:
+        latency.latency_table(wr, map, chain, defines)
+
+def run_estimate(outfile: str, srcfile: str, ids: list[str], points: list[dict[str, int]]):
+    import parser, estimate
+    map = parser.parse_file(srcfile)
+    for id in ids:
+        map[id].generate()
+    with make_writer(outfile) as wr:
+        estimate.estimate_table(wr, map, ids, points)
+
+def run_simulate(outfile: str, srcfile: str, id: str, defines: dict[str, int], cycles: int, batch: int, rate: float, seed: int|None):
+    import parser, model
+    map = parser.parse_file(srcfile)
+    map[id].generate()
+    sim = model.MuxModel(map[id], map, defines, batch=batch, seed=seed)
+    res = sim.run(*sim.random_traffic(cycles, rate)).report()
+    with make_writer(outfile) as wr:
+        for k in res:
+            wr.line(f"{k}={res[k]}")
 
 if __name__ == "__main__":
+    import argparse
     ap = argparse.ArgumentParser("bustool.py")
     ap.add_argument("--outfile", "-o", action="store", help="The file to output to, - is stdout", default="-")
+    ap.add_argument("--testbench", "-t", action="store_true", help="Also emit a throughput testbench after each interface and multiplexer.")
+    ap.add_argument("--latency", "-l", action="store", metavar="ID[,ID...]", help="Print the request-to-response latency through a chain of entities instead of generating code.")
+    ap.add_argument("--estimate", "-e", action="store", metavar="ID[,ID...]", help="Print estimated resource usage of entities instead of generating code.")
+    ap.add_argument("--sweep", "-s", action="append", metavar="NAME=VALUE,...", help="Estimate every combination of these parameter values.", default=[])
+    ap.add_argument("--simulate", action="store", metavar="ID", help="Run random traffic through a cycle-level model of a multiplexer instead of generating code.")
+    ap.add_argument("--cycles", action="store", type=int, help="Number of cycles per simulated trace.", default=10000)
+    ap.add_argument("--batch", action="store", type=int, help="Number of traces simulated at once.", default=100)
+    ap.add_argument("--rate", action="store", type=float, help="Chance of a request each cycle.", default=1.0)
+    ap.add_argument("--seed", action="store", type=int, help="Random seed for the simulation.", default=None)
+    ap.add_argument("--define", "-D", action="append", metavar="NAME=VALUE", help="Parameter value used for analysis, defaults are used for the rest.", default=[])
     ap.add_argument("srcfile", action="store", help="The bus definition file to process.")
     args = ap.parse_args()
-    run(args.outfile, args.srcfile)
+    try:
+        if args.latency:
+            run_latency(args.outfile, args.srcfile, args.latency.split(','), parse_defines(args.define))
+        elif args.simulate:
+            run_simulate(args.outfile, args.srcfile, args.simulate, parse_defines(args.define), args.cycles, args.batch, args.rate, args.seed)
+        elif args.estimate:
+            run_estimate(args.outfile, args.srcfile, args.estimate.split(','), parse_sweep(args.sweep, parse_defines(args.define)))
+        else:
+            run(args.outfile, args.srcfile, args.testbench)
+    except ValueError as e:
+        ap.error(str(e))
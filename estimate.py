@@ -0,0 +1,197 @@
+
+from parser import *
+from widths import Widths
+from latency import chain_bus, chain_params
+import math
+
+
+class Resources:
+    """Approximate resource usage: flip-flops, 2-input gate equivalents, 6-input LUTs and multiplexer inputs."""
+    def __init__(self, ff: int = 0, gates: int = 0, luts: int = 0, mux_inputs: int = 0):
+        self.ff         = ff
+        self.gates      = gates
+        self.luts       = luts
+        self.mux_inputs = mux_inputs
+    
+    def reduce(self, bits: int, inputs: int):
+        """Add `bits` copies of a function of `inputs` inputs."""
+        if inputs > 1:
+            self.gates += bits * (inputs - 1)
+            self.luts  += bits * math.ceil((inputs - 1) / 5)
+    
+    def select(self, bits: int, inputs: int):
+        """Add an AND-OR selector picking one of `inputs` values of `bits` bits."""
+        self.mux_inputs += bits * inputs
+        self.reduce(bits, 2 * inputs)
+    
+    def __add__(self, other):
+        return Resources(self.ff + other.ff, self.gates + other.gates, self.luts + other.luts, self.mux_inputs + other.mux_inputs)
+    
+    def __mul__(self, n: int):
+        return Resources(self.ff * n, self.gates * n, self.luts * n, self.mux_inputs * n)
+    
+    def __repr__(self):
+        return f"Resources(ff={self.ff}, gates={self.gates}, luts={self.luts}, mux_inputs={self.mux_inputs})"
+
+
+def _type_width(typ: Expression, params: dict) -> int:
+    """Width of a `bit[msb:lsb]` or plain `bit` type parameter."""
+    if type(typ.typ) is not Operator:
+        return 1
+    return typ.args[1].compile()(params) - typ.args[2].compile()(params) + 1
+
+
+class Estimator:
+    """Walks the generated IR of one entity and estimates its resources for a parameter point."""
+    def __init__(self, ent: ActiveEntity):
+        if not isinstance(ent, ActiveEntity):
+            raise ValueError(f"{ent.id} is not a generated entity")
+        self.ent    = ent
+        self.widths = Widths(ent.params, ent.signals, ent.body)
+    
+    def estimate(self, params: dict) -> Resources:
+        res = Resources()
+        for stmt in self.ent.body:
+            res += self.statement(stmt, params)
+        return res
+    
+    def statement(self, stmt, params: dict, clocked: bool|None = None) -> Resources:
+        """
+        Resources of one statement; `clocked` is None outside always blocks,
+        inside them it tells whether assigned values are registered.
+        """
+        res = Resources()
+        if type(stmt) is Assign:
+            res += self.expression(stmt.val, params)
+            if clocked:
+                res.ff += self.widths.eval(Expression(stmt.var), params) or 0
+        elif type(stmt) is GenBlock:
+            for elem in stmt.body:
+                res += self.statement(elem, params)
+        elif type(stmt) is Block:
+            for elem in stmt.body:
+                res += self.statement(elem, params, stmt.clock is not None)
+        elif type(stmt) is If and clocked is not None:
+            # Conditions inside always blocks are logic rather than generate-time choices.
+            for cond, body in [(stmt.cond, stmt.body)] + stmt.b_elif:
+                res += self.expression(cond, params)
+                for elem in body:
+                    res += self.statement(elem, params, clocked)
+            for elem in stmt.b_else or []:
+                res += self.statement(elem, params, clocked)
+        elif type(stmt) is For:
+            count = stmt.cond.args[1].compile()(params) if stmt.cond.typ is operators["$lt"] else 1
+            for elem in stmt.body:
+                res += self.statement(elem, params) * count
+        elif type(stmt) is If:
+            body = stmt.b_else or []
+            for cond, elif_body in [(stmt.cond, stmt.body)] + stmt.b_elif:
+                if cond.compile()(params):
+                    body = elif_body
+                    break
+            for elem in body:
+                res += self.statement(elem, params)
+        elif type(stmt) is Instance:
+            res += self.instance(stmt, params)
+        return res
+    
+    def instance(self, inst: Instance, params: dict) -> Resources:
+        res = Resources()
+        if inst.typ == "hu_pipeline_reg":
+            width = _type_width(inst.params["regtype"], params)
+            depth = inst.params["depth"].compile()(params)
+            res.ff += depth * width
+            if "skid" in inst.params:
+                res.ff += width + 1
+                res.select(width, 2)
+        elif inst.typ in ["hu_selector", "hu_tree_selector"]:
+            width = _type_width(inst.params["seltype"], params)
+            count = inst.params["width"].compile()(params)
+            res.select(width, count)
+            if inst.typ == "hu_tree_selector":
+                every  = inst.params["stage_every"].compile()(params)
+                levels = math.ceil(math.log2(count)) if count > 1 else 0
+                for level in range(1, levels + 1):
+                    if every > 0 and level % every == 0:
+                        res.ff += width * ((1 << levels) >> level)
+        elif inst.typ == "hu_fifo":
+            width = _type_width(inst.params["regtype"], params)
+            depth = inst.params["depth"].compile()(params)
+            abits = max(1, math.ceil(math.log2(depth))) if depth > 1 else 1
+            res.ff += depth * width + 3 * abits + 1
+            res.select(width, depth)
+            res.reduce(3 * abits + 1, 3)
+        elif inst.typ == "hu_async_fifo":
+            width = _type_width(inst.params["regtype"], params)
+            depth = inst.params["depth"].compile()(params)
+            sync  = inst.params["sync_stages"].compile()(params)
+            abits = max(1, math.ceil(math.log2(depth)))
+            # Binary and gray pointers on both sides plus the synchronizer chains.
+            res.ff += depth * width + (4 + 2 * sync) * (abits + 1)
+            res.select(width, depth)
+            res.reduce(6 * (abits + 1), 3)
+        for sig in inst.signals.values():
+            if type(sig) is Expression:
+                res += self.expression(sig, params)
+        return res
+    
+    def expression(self, expr: Expression, params: dict) -> Resources:
+        res = Resources()
+        if type(expr.typ) is not Operator:
+            return res
+        for arg in expr.args:
+            res += self.expression(arg, params)
+        key   = "$" + expr.typ.name
+        width = [self.widths.eval(x, params) or 1 for x in expr.args]
+        if key in ["$andb", "$orb", "$xorb", "$add", "$sub"]:
+            res.reduce(max(width), len(expr.args))
+        elif key in ["$and", "$or"]:
+            res.reduce(1, len(expr.args))
+        elif key in ["$eq", "$ne", "$gt", "$lt", "$ge", "$le"]:
+            res.reduce(1, 2 * max(width))
+        elif key == "$if":
+            res.select(max(width[1:]), 2)
+        elif key in ["$shl", "$shr"] and expr.args[1].typ != "const":
+            res.select(width[0], self.shift_positions(expr.args[1], width[0], params))
+        return res
+    
+    def shift_positions(self, amount: Expression, width: int, params: dict) -> int:
+        """Number of distinct positions a variable shift by `amount` can move a `width`-bit value to."""
+        if type(amount.typ) is Operator and "$" + amount.typ.name in ["$mul", "$prod"]:
+            # A constant factor only spaces the positions out, e.g. a byte lane select.
+            amount = [x for x in amount.args if x.typ != "const"]
+            if len(amount) != 1:
+                return width
+            amount = amount[0]
+        bits = self.widths.eval(amount, params)
+        return width if bits is None or bits >= 31 else min(width, 1 << bits)
+
+
+def estimate(map: dict, id: str, params: dict = {}) -> Resources:
+    """Resources of generated entity `id` for `params`, defaults are used for the rest."""
+    return Estimator(map[id]).estimate(chain_params(map, [id], params))
+
+def sweep(map: dict, id: str, points: list[dict]) -> list[Resources]:
+    """Resources of generated entity `id` for every parameter point in `points`."""
+    est = Estimator(map[id])
+    return [est.estimate(chain_params(map, [id], x)) for x in points]
+
+def estimate_table(wr, map: dict, ids: list[str], points: list[dict]):
+    """Print the resources of each entity in `ids` at each parameter point as a table."""
+    keys = []
+    for point in points:
+        keys += [k for k in point if k not in keys]
+    # Each entity only takes the swept parameters it has; a name no entity has is a mistake.
+    known = {id: [param.id for param in chain_bus(map, [id]).params + map[id].params] for id in ids}
+    for k in keys:
+        if not any(k in known[id] for id in ids):
+            raise ValueError(f"Unknown parameter {k}")
+    head = ["entity"] + keys + ["ff", "gates", "luts", "mux_inputs"]
+    rows = []
+    for id in ids:
+        own = [{k: v for k, v in point.items() if k in known[id]} for point in points]
+        for point, res in zip(own, sweep(map, id, own)):
+            rows.append([id] + [str(point[k]) if k in point else "" for k in keys] + [str(res.ff), str(res.gates), str(res.luts), str(res.mux_inputs)])
+    width = [max(len(row[i]) for row in [head] + rows) for i in range(len(head))]
+    for row in [head] + rows:
+        wr.line("  ".join(row[i].ljust(width[i]) for i in range(len(row))).rstrip())
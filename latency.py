@@ -0,0 +1,60 @@
+
+from parser import *
+from writer import *
+
+
+def chain_bus(map: dict, chain: list[str]) -> AsymmetricBus:
+    """The bus shared by all entities of `chain`."""
+    bus = None
+    for id in chain:
+        ent = map[id]
+        cur = ent if type(ent) is AsymmetricBus else ent.bus
+        if bus and cur is not bus:
+            raise ValueError(f"{id} is not on bus {bus.id}")
+        bus = cur
+    if bus is None:
+        raise ValueError("Empty entity chain")
+    return bus
+
+def chain_params(map: dict, chain: list[str], overrides: dict = {}) -> dict[str, int]:
+    """Parameter values for `chain`: `overrides` plus the defaults of every other parameter."""
+    params = dict(overrides)
+    bus    = chain_bus(map, chain)
+    known  = bus.params + [x for id in chain for x in map[id].params]
+    for id in overrides:
+        if id not in [param.id for param in known]:
+            raise ValueError(f"Unknown parameter {id}")
+    for param in known:
+        if param.local and param.id in params:
+            raise ValueError(f"Parameter {param.id} cannot be overridden")
+        if param.id not in params:
+            params[param.id] = param.default.compile()(params)
+    return params
+
+def chain_latency(map: dict, chain: list[str], params: dict = {}) -> dict[str, list[int]]:
+    """
+    Request-to-response time of every return signal through `chain`, a list of entity ids in front of the bus's devices.
+    Returns per signal the clock cycles contributed by the bus and by each entity; the entities must have been generated.
+    """
+    bus    = chain_bus(map, chain)
+    params = chain_params(map, chain, params)
+    res    = {}
+    for sig in bus.signals:
+        if sig.dir != "input": continue
+        base = sig.time.compile()(params)
+        res[sig.id] = [base]
+        for id in chain:
+            if map[id] is bus: continue
+            timing = map[id].timing()
+            res[sig.id].append(timing[sig.id].compile()(params) - base if sig.id in timing else 0)
+    return res
+
+def latency_table(wr: Writer, map: dict, chain: list[str], params: dict = {}):
+    """Print the per-signal latency of `chain` as a table."""
+    bus   = chain_bus(map, chain)
+    lat   = chain_latency(map, chain, params)
+    head  = ["signal", bus.id] + [id for id in chain if map[id] is not bus] + ["total"]
+    rows  = [[id] + [str(x) for x in lat[id]] + [str(sum(lat[id]))] for id in lat]
+    width = [max(len(row[i]) for row in [head] + rows) for i in range(len(head))]
+    for row in [head] + rows:
+        wr.line("  ".join(row[i].ljust(width[i]) for i in range(len(row))).rstrip())
@@ -0,0 +1,226 @@
+
+from parser import *
+from latency import chain_params
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The transaction model requires NumPy") from None
+    return numpy
+
+
+def even_map(devs: int, width: int) -> list[MapEntry]:
+    """Address map splitting the address space evenly on the top address bits."""
+    bits = max(1, (devs - 1).bit_length())
+    mask = ((1 << bits) - 1) << (width - bits)
+    return [MapEntry(i << (width - bits), mask) for i in range(devs)]
+
+
+class DeviceModel:
+    """Behaviour of one modelled device: chance per cycle of stalling or refusing requests, and extra random response delay."""
+    __repr__ = reflect_repr
+    def __init__(self, stall: float = 0.0, refuse: float = 0.0, jitter: int = 0):
+        self.stall  = stall
+        self.refuse = refuse
+        self.jitter = jitter
+
+
+class Stats:
+    """Totals over all traces of a simulation run."""
+    __repr__ = reflect_repr
+    def __init__(self, cycles: int = 0, requests: int = 0, accepted: int = 0, responses: int = 0, latency: int = 0, max_latency: int = 0, stalls: int = 0, held: int = 0):
+        self.cycles      = cycles
+        self.requests    = requests
+        self.accepted    = accepted
+        self.responses   = responses
+        self.latency     = latency
+        self.max_latency = max_latency
+        self.stalls      = stalls
+        self.held        = held
+    
+    def throughput(self) -> float:
+        """Accepted transactions per cycle."""
+        return self.accepted / self.cycles if self.cycles else 0.0
+    
+    def avg_latency(self) -> float:
+        """Average request-to-response time in cycles."""
+        return self.latency / self.responses if self.responses else 0.0
+    
+    def report(self) -> dict:
+        return {
+            "cycles":      self.cycles,
+            "requests":    self.requests,
+            "accepted":    self.accepted,
+            "responses":   self.responses,
+            "throughput":  round(self.throughput(), 4),
+            "avg_latency": round(self.avg_latency(), 4),
+            "max_latency": self.max_latency,
+            "stalls":      self.stalls,
+            "held":        self.held
+        }
+
+
+class MuxModel:
+    """
+    Cycle-level model of a generated BusMux, following its transaction spec and return path timing.
+    Simulates `batch` independent traces at once; all state is kept in NumPy arrays with one row per trace.
+    """
+    def __init__(self, mux: BusMux, map: dict, params: dict = {}, devices: list[DeviceModel] = None, address_map: list[MapEntry] = None, batch: int = 1, seed: int = None):
+        if type(mux) is not BusMux:
+            raise ValueError(f"{mux.id} is not a multiplexer")
+        np = _numpy()
+        self.np      = np
+        self.mux     = mux
+        self.params  = chain_params(map, [mux.id], params)
+        self.devs    = self.params[mux.dev_count]
+        self.devices = devices or [DeviceModel() for _ in range(self.devs)]
+        self.map     = mux.static_map or address_map or even_map(self.devs, mux.addr_width())
+        self.batch   = batch
+        self.rng     = np.random.default_rng(seed)
+        if len(self.devices) != self.devs:
+            raise ValueError(f"Expected {self.devs} device models")
+        if not self.map or len(self.map) != self.devs:
+            raise ValueError(f"Expected an address map with {self.devs} entries")
+        
+        trans = mux.bus.trans
+        self.can_stall  = not (trans.stall.typ == "const" and not trans.stall.args)
+        self.can_refuse = not (trans.accept.typ == "const" and trans.accept.args)
+        # A device refuses requests exactly when it stalls if both share a signal.
+        self.tied       = any(x in trans.stall.vars for x in trans.accept.vars)
+        data = [v for v in mux.bus.signals if v.dir == "input" and v.id not in trans.stall.vars and v.id not in trans.accept.vars]
+        self.latency = max([v.time.compile()(self.params) for v in data] + [0])
+        self.depth   = max([mux.timing()[v.id].compile()(self.params) for v in data] + [0])
+        self.p_stall  = np.array([x.stall for x in self.devices])
+        self.p_refuse = np.array([x.refuse for x in self.devices])
+        self.jitter   = np.array([x.jitter for x in self.devices])
+    
+    def decode(self, addr):
+        """Device index selected by each address, -1 where no device is mapped."""
+        np  = self.np
+        dev = np.full(addr.shape, -1, dtype=np.int64)
+        for i in range(len(self.map)):
+            hit = (addr & self.map[i].mask) == self.map[i].addr
+            dev = np.where(hit & (dev < 0), i, dev)
+        return dev
+    
+    def random_traffic(self, cycles: int, rate: float = 1.0, weights: list[float] = None):
+        """Request and address arrays of shape (cycles, batch) with requests at `rate` spread over the mapped devices."""
+        np      = self.np
+        request = self.rng.random((cycles, self.batch)) < rate
+        dev     = self.rng.choice(self.devs, (cycles, self.batch), p=weights)
+        base    = np.array([x.addr for x in self.map])
+        free    = np.array([~x.mask for x in self.map])
+        addr    = base[dev] | (self.rng.integers(0, 1 << 30, (cycles, self.batch)) & free[dev] & ((1 << 30) - 1))
+        return request, addr
+    
+    def run(self, request, addr) -> Stats:
+        """Simulate the traffic in `request` and `addr`, both of shape (cycles, batch)."""
+        if self.mux.mode == "fifo":
+            return self._run_fifo(request, self.decode(addr))
+        return self._run_fixed(request, self.decode(addr))
+    
+    def _handshake(self, sel):
+        """Per-trace stall and refusal of the selected device this cycle; a stalling device does not take requests either."""
+        np      = self.np
+        rows    = np.arange(self.batch)
+        has     = sel >= 0
+        selc    = np.where(has, sel, 0)
+        stalled = self.rng.random((self.batch, self.devs)) < self.p_stall
+        refused = stalled if self.tied else stalled | (self.rng.random((self.batch, self.devs)) < self.p_refuse)
+        stall   = has & stalled[rows, selc] if self.can_stall else np.zeros(self.batch, dtype=bool)
+        refuse  = has & refused[rows, selc] if self.can_refuse else stall
+        return has, selc, stall, refuse
+    
+    def _run_fixed(self, request, dev) -> Stats:
+        np    = self.np
+        stats = Stats()
+        depth = self.depth
+        pipe  = np.full((self.batch, depth), -1, dtype=np.int64)
+        for t in range(request.shape[0]):
+            has, selc, stall, refuse = self._handshake(dev[t])
+            req      = request[t] & has
+            accepted = req & ~refuse
+            
+            # Return data arrives a fixed time after its request was taken, whatever the devices do meanwhile.
+            if depth:
+                out = pipe[:, -1]
+                got = out >= 0
+                lat = t - out[got]
+            else:
+                got = accepted
+                lat = np.zeros(int(got.sum()), dtype=np.int64)
+            stats.responses += int(got.sum())
+            stats.latency   += int(lat.sum())
+            if len(lat):
+                stats.max_latency = max(stats.max_latency, int(lat.max()))
+            if depth:
+                pipe = np.concatenate([np.where(accepted, t, -1)[:, None], pipe[:, :-1]], axis=1)
+            
+            stats.requests += int(req.sum())
+            stats.accepted += int(accepted.sum())
+            stats.stalls   += int(stall.sum())
+            stats.held     += int((req & ~accepted).sum())
+        stats.cycles = request.shape[0] * self.batch
+        return stats
+    
+    def _run_fifo(self, request, dev) -> Stats:
+        np      = self.np
+        stats   = Stats()
+        rows    = np.arange(self.batch)
+        fdepth  = self.mux.fifo_depth
+        skid    = self.mux.skid
+        # Responses wait at least one cycle in the device's buffer, the rest is selector latency.
+        extra   = self.depth - self.latency - 1
+        issue   = np.zeros((self.batch, fdepth), dtype=np.int64)
+        resp    = np.zeros((self.batch, fdepth), dtype=np.int64)
+        rd      = np.zeros(self.batch, dtype=np.int64)
+        count   = np.zeros(self.batch, dtype=np.int64)
+        last    = np.full((self.batch, self.devs), -1, dtype=np.int64)
+        skid_valid = np.zeros(self.batch, dtype=bool)
+        skid_dev   = np.full(self.batch, -1, dtype=np.int64)
+        skid_time  = np.zeros(self.batch, dtype=np.int64)
+        for t in range(request.shape[0]):
+            # With a skid buffer, the devices see the request waiting in it before a new one.
+            req    = request[t] & (dev[t] >= 0)
+            target = np.where(skid_valid, skid_dev, dev[t])
+            has, selc, stall, refuse = self._handshake(target)
+            full   = count == fdepth
+            issued = (skid_valid | req) & ~refuse & ~full
+            if skid:
+                accepted = req & ~skid_valid
+                since    = np.where(skid_valid, skid_time, t)
+            else:
+                accepted = issued
+                since    = np.full(self.batch, t)
+            
+            # Responses leave in request order once buffered, whichever device they came from.
+            pop = (count > 0) & (resp[rows, rd] < t)
+            lat = t - issue[rows, rd][pop] + extra
+            stats.responses += int(pop.sum())
+            stats.latency   += int(lat.sum())
+            if len(lat):
+                stats.max_latency = max(stats.max_latency, int(lat.max()))
+            
+            # Each device answers its own requests in order, at most one response per cycle.
+            wr   = (rd + count) % fdepth
+            due  = t + self.latency + self.rng.integers(0, self.jitter[selc] + 1)
+            due  = np.maximum(due, last[rows, selc] + 1)
+            issue[rows, wr] = np.where(issued, since, issue[rows, wr])
+            resp[rows, wr]  = np.where(issued, due, resp[rows, wr])
+            last[rows, selc] = np.where(issued, due, last[rows, selc])
+            rd      = np.where(pop, (rd + 1) % fdepth, rd)
+            count   = count + issued - pop
+            if skid:
+                catch      = accepted & ~issued
+                skid_dev   = np.where(catch, dev[t], skid_dev)
+                skid_time  = np.where(catch, t, skid_time)
+                skid_valid = (skid_valid & ~issued) | catch
+            
+            stats.requests += int(req.sum())
+            stats.accepted += int(accepted.sum())
+            stats.stalls   += int(stall.sum())
+            stats.held     += int((req & ~accepted).sum())
+        stats.cycles = request.shape[0] * self.batch
+        return stats
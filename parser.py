@@ -1,5 +1,5 @@
 
-import yaml, math
+import operator
 
 
 def reflect_repr(instance):
@@ -10,6 +10,10 @@ def reflect_repr(instance):
 
 
 class Operator:
+    """
+    Expression operator; `func` takes the operands as separate arguments,
+    or as one list if the operator takes any number of them.
+    """
     def __init__(self, name, precedence, builder, func, min_args = 2, max_args = 2**32):
         self.name       = name
         self.precedence = precedence
@@ -17,6 +21,7 @@ class Operator:
         self.func       = func
         self.min_args   = min_args
         self.max_args   = max_args
+        self.variadic   = min_args != max_args
     
     def check_argc(self, n):
         if not self.min_args <= n <= self.max_args:
@@ -24,7 +29,7 @@ class Operator:
     
     def __call__(self, args: list[int]):
         self.check_argc(len(args))
-        return self.func(args)
+        return self.func(args) if self.variadic else self.func(*args)
     
     def __repr__(self):
         return self.name
@@ -45,19 +50,26 @@ def _product(args: list[int]):
     for i in args: n *= i
     return n
 
-def _clog2(args: list[int]):
-    return math.ceil(math.log2(args[0]))
+def _clog2(val: int):
+    return max(0, val - 1).bit_length()
 
-def _bitslice(args: list[int]):
-    val = args[0]
-    msb = args[1]
-    lsb = args[2]
-    return (val >> lsb) & ((1 << (msb - lsb)) - 1)
+def _and(a: int, b: int):
+    return a and b
 
-def _index(args: list[int]):
-    val = args[0]
-    msb = args[1]
-    return (val >> msb) & 1
+def _or(a: int, b: int):
+    return a or b
+
+def _if(cond: int, a: int, b: int):
+    return a if cond else b
+
+def _set(var: int, val: int):
+    return val
+
+def _bitslice(val: int, msb: int, lsb: int):
+    return (val >> lsb) & ((1 << (msb - lsb + 1)) - 1)
+
+def _index(val: int, bit: int):
+    return (val >> bit) & 1
 
 def _slb(oper: Operator, args: list[str]):
     tmp = []
@@ -77,32 +89,32 @@ operators = {
     
     "$clog2": Operator("clog2", 10, "$clog2", _clog2, 1, 1),
     
-    "$not":   Operator("not",   10, "!",  lambda x: not x[0],      1, 1),
-    "$and":   Operator("and",   1,  "&&", lambda x: x[0] and x[1], 2, 2),
-    "$or":    Operator("or",    0,  "||", lambda x: x[0] or  x[1], 2, 2),
-    
-    "$notb":  Operator("notb",  0,  "~",  lambda x: ~x[0],         1, 1),
-    "$andb":  Operator("andb",  4,  "&",  lambda x: x[0] &   x[1], 2, 2),
-    "$orb":   Operator("orb",   2,  "|",  lambda x: x[0] |   x[1], 2, 2),
-    "$xorb":  Operator("xorb",  3,  "^",  lambda x: x[0] ^   x[1], 2, 2),
-    "$shl":   Operator("shl",   7,  "<<", lambda x: x[0] <<  x[1], 2, 2),
-    "$shr":   Operator("shr",   7,  ">>", lambda x: x[0] >>  x[1], 2, 2),
-    
-    "$add":   Operator("add",   8,  "+",  lambda x: x[0] +  x[1], 2, 2),
-    "$sub":   Operator("sub",   8,  "-",  lambda x: x[0] -  x[1], 2, 2),
-    "$mul":   Operator("mul",   9,  "*",  lambda x: x[0] *  x[1], 2, 2),
-    "$div":   Operator("div",   9,  "/",  lambda x: x[0] // x[1], 2, 2),
-    "$mod":   Operator("mod",   9,  "%",  lambda x: x[0] %  x[1], 2, 2),
-    
-    "$gt":    Operator("gt",    6,  ">",  lambda x: x[0] >  x[1], 2, 2),
-    "$lt":    Operator("lt",    6,  "<",  lambda x: x[0] <  x[1], 2, 2),
-    "$ge":    Operator("ge",    6,  ">=", lambda x: x[0] >= x[1], 2, 2),
-    "$le":    Operator("le",    6,  "<=", lambda x: x[0] <= x[1], 2, 2),
-    "$eq":    Operator("eq",    5,  "==", lambda x: x[0] == x[1], 2, 2),
-    "$ne":    Operator("ne",    5,  "!=", lambda x: x[0] != x[1], 2, 2),
-    
-    "$if":    Operator("if",    -1, _ifb, lambda x: x[1] if x[0] else x[2], 3, 3),
-    "$set":   Operator("set",   -2, "=",  lambda x: x[1], 2, 2),
+    "$not":   Operator("not",   10, "!",  operator.not_,     1, 1),
+    "$and":   Operator("and",   1,  "&&", _and,              2, 2),
+    "$or":    Operator("or",    0,  "||", _or,               2, 2),
+    
+    "$notb":  Operator("notb",  0,  "~",  operator.invert,   1, 1),
+    "$andb":  Operator("andb",  4,  "&",  operator.and_,     2, 2),
+    "$orb":   Operator("orb",   2,  "|",  operator.or_,      2, 2),
+    "$xorb":  Operator("xorb",  3,  "^",  operator.xor,      2, 2),
+    "$shl":   Operator("shl",   7,  "<<", operator.lshift,   2, 2),
+    "$shr":   Operator("shr",   7,  ">>", operator.rshift,   2, 2),
+    
+    "$add":   Operator("add",   8,  "+",  operator.add,      2, 2),
+    "$sub":   Operator("sub",   8,  "-",  operator.sub,      2, 2),
+    "$mul":   Operator("mul",   9,  "*",  operator.mul,      2, 2),
+    "$div":   Operator("div",   9,  "/",  operator.floordiv, 2, 2),
+    "$mod":   Operator("mod",   9,  "%",  operator.mod,      2, 2),
+    
+    "$gt":    Operator("gt",    6,  ">",  operator.gt,       2, 2),
+    "$lt":    Operator("lt",    6,  "<",  operator.lt,       2, 2),
+    "$ge":    Operator("ge",    6,  ">=", operator.ge,       2, 2),
+    "$le":    Operator("le",    6,  "<=", operator.le,       2, 2),
+    "$eq":    Operator("eq",    5,  "==", operator.eq,       2, 2),
+    "$ne":    Operator("ne",    5,  "!=", operator.ne,       2, 2),
+    
+    "$if":    Operator("if",    -1, _ifb, _if,               3, 3),
+    "$set":   Operator("set",   -2, "=",  _set,              2, 2),
     "$slice": Operator("slice", 10, _slb, _bitslice, 3, 3),
     "$index": Operator("index", 10, _slb, _index, 2, 2)
 }
@@ -118,6 +130,7 @@ class Expression:
         self.typ        = typ
         self.args       = args
         self.precedence = 11
+        self.compiled   = None
         if typ == "var":
             self.vars = {args: args}
         elif type(typ) is Operator:
@@ -160,6 +173,36 @@ class Expression:
             raise ValueError("Invalid expression type: " + repr(self.typ))
         return int(self.typ([x.eval(vars) for x in self.args]))
     
+    def compile(self):
+        """Python function equivalent to `eval`; built once and reused for every set of variables."""
+        if self.compiled:
+            return self.compiled
+        if self.typ == "var":
+            name = self.args
+            self.compiled = lambda vars: vars[name]
+        elif self.typ == "const":
+            value = self.args
+            self.compiled = lambda vars: value
+        elif type(self.typ) is not Operator:
+            raise ValueError("Invalid expression type: " + repr(self.typ))
+        elif self.typ.variadic:
+            func = self.typ.func
+            args = [x.compile() for x in self.args]
+            self.compiled = lambda vars: int(func([x(vars) for x in args]))
+        else:
+            # Operators with a fixed number of operands get their operands passed directly.
+            func = self.typ.func
+            args = [x.compile() for x in self.args]
+            if len(args) == 1:
+                a, = args
+                self.compiled = lambda vars: int(func(a(vars)))
+            elif len(args) == 2:
+                a, b = args
+                self.compiled = lambda vars: int(func(a(vars), b(vars)))
+            else:
+                self.compiled = lambda vars: int(func(*[x(vars) for x in args]))
+        return self.compiled
+    
     def build(self, vars: dict = {}):
         if self.typ == "var":
             return vars[self.args]
@@ -177,16 +220,25 @@ class Expression:
         
         return self.typ.build(tmp)
     
+    def subst(self, vars: dict):
+        """Copy of this expression with variables replaced by the expressions in `vars`."""
+        if self.typ == "var":
+            return vars[self.args] if self.args in vars else self
+        elif type(self.typ) is Operator:
+            return Expression(self.typ, [x.subst(vars) for x in self.args])
+        return self
+    
     def __repr__(self):
         return self.build(self.vars)
 
 
 class Parameter:
     __repr__ = reflect_repr
-    def __init__(self, id: str, desc: str, default: Expression):
+    def __init__(self, id: str, desc: str, default: Expression, local: bool = False):
         self.id      = id
         self.desc    = desc
         self.default = default
+        self.local   = local
     
     @staticmethod
     def parse(id: str, raw: dict):
@@ -231,6 +283,45 @@ class Span:
         return Span(Expression("const", 0), Expression("const", 0))
 
 
+def _offset(expr: Expression) -> tuple[Expression|None, int]:
+    """Split a folded expression into a part that is not constant and a constant added to it."""
+    if expr.typ == "const":
+        return None, expr.args
+    elif expr.typ is operators["$add"] or expr.typ is operators["$sub"]:
+        (a, x), (b, y) = _offset(expr.args[0]), _offset(expr.args[1])
+        if expr.typ is operators["$sub"]:
+            if b is None:
+                return a, x - y
+            elif a is None:
+                return Expression("$sub", [Expression("const", x - y), b]), 0
+            return Expression("$sub", [a, b]), x - y
+        if a is None or b is None:
+            return a if b is None else b, x + y
+        return Expression("$add", [a, b]), x + y
+    return expr, 0
+
+def fold(expr: Expression) -> Expression:
+    """Constant-fold an expression as far as possible, merging the constants of sums and differences."""
+    if type(expr.typ) is not Operator:
+        return expr
+    args = [fold(x) for x in expr.args]
+    if all(x.typ == "const" for x in args):
+        return Expression("const", int(expr.typ([x.args for x in args])))
+    res = Expression(expr.typ, args)
+    if expr.typ is operators["$add"] or expr.typ is operators["$sub"]:
+        base, offset = _offset(res)
+        if offset > 0:
+            return Expression("$add", [base, Expression("const", offset)])
+        elif offset < 0:
+            return Expression("$sub", [base, Expression("const", -offset)])
+        return base
+    return res
+
+def span_width(span: Span) -> Expression:
+    """Number of bits covered by `span`."""
+    return fold(Expression("$add", [Expression("$sub", [span.msb, span.lsb]), Expression("const", 1)]))
+
+
 class ClockSpec:
     __repr__ = reflect_repr
     def __init__(self, typ: str, sigid: str, rising: bool):
@@ -253,11 +344,17 @@ class ClockSpec:
 
 
 class TransSpec:
+    """
+    Handshake of a transaction. A request is taken in a cycle where `request` and `accept` hold; the controller keeps its
+    request on the bus while `stall` holds. Stalls never delay data already requested: return signals follow `Signal.time`
+    cycles after the request was taken, or come with `response` if the bus has one.
+    """
     __repr__ = reflect_repr
-    def __init__(self, request: Expression, accept: Expression, stall: Expression):
-        self.request = request
-        self.accept  = accept
-        self.stall   = stall
+    def __init__(self, request: Expression, accept: Expression, stall: Expression, response: Expression = None):
+        self.request  = request
+        self.accept   = accept
+        self.stall    = stall
+        self.response = response
     
     @staticmethod
     def parse(raw):
@@ -267,12 +364,13 @@ class TransSpec:
             Expression.parse(raw["request"]),
             Expression.parse(raw["accept"]) if "accept" in raw else Expression("const", 1),
             Expression.parse(raw["stall"])  if "stall"  in raw else Expression("const", 0),
+            Expression.parse(raw["response"]) if "response" in raw else None,
         )
 
 
 class Signal:
     __repr__ = reflect_repr
-    def __init__(self, id: str, desc: str, span: Span, count = Expression("const", 1), time = Expression("const", 0), dir: str = "input", masked: bool = False):
+    def __init__(self, id: str, desc: str, span: Span, count = Expression("const", 1), time = Expression("const", 0), dir: str = "input", masked: bool = False, init: Expression = None):
         self.id     = id
         self.desc   = desc
         self.span   = span
@@ -280,6 +378,7 @@ class Signal:
         self.time   = time
         self.dir    = dir
         self.masked = masked
+        self.init   = init
     
     @staticmethod
     def parse(id, raw):
@@ -289,7 +388,7 @@ class Signal:
             id,
             raw["desc"] if "desc" in raw else None,
             Span.parse(raw["span"]) if "span" in raw else Span.default(),
-            Expression.parse(raw["count"]) if "count" in raw else Expression("const", 0),
+            Expression.parse(raw["count"]) if "count" in raw else Expression("const", 1),
             Expression.parse(raw["time"]) if "time" in raw else Expression("const", 0),
             raw["dir"] if "dir" in raw else None,
             raw["masked"] if "masked" in raw else False
@@ -314,11 +413,31 @@ class AsymmetricBus:
     def generate(self):
         pass
     
+    def timing(self) -> dict[str, Expression]:
+        """Time from request to each signal, in clock cycles."""
+        return {sig.id: sig.time for sig in self.signals}
+    
     def getsignal(self, id: str) -> Signal|None:
         for sig in self.signals:
             if sig.id == id:
                 return sig
         return None
+
+    def controls(self) -> list[str]:
+        """Return signals that take part in the handshake rather than carrying data."""
+        return [x for x in self.trans.stall.vars] + [x for x in self.trans.accept.vars if x not in self.trans.stall.vars]
+    
+    def port_expr(self, expr: Expression, port: str) -> Expression:
+        """Transaction expression in terms of the signals of bus instance `port`."""
+        return expr.subst({sig.id: Expression(f"{port}.{sig.id}") for sig in self.signals})
+    
+    def accepted(self, port: str) -> Expression:
+        """Condition under which the request on bus instance `port` is accepted."""
+        request = self.port_expr(self.trans.request, port)
+        accept  = self.port_expr(self.trans.accept, port)
+        if accept.typ == "const" and accept.args:
+            return request
+        return Expression("$and", [request, accept])
     
     @staticmethod
     def parse(id: str, raw: dict):
@@ -352,6 +471,83 @@ class Arbiter:
         return Arbiter(raw["type"])
 
 
+class MapEntry:
+    __repr__ = reflect_repr
+    def __init__(self, addr: int, mask: int):
+        self.addr = addr
+        self.mask = mask
+    
+    def overlaps(self, other) -> bool:
+        return (self.addr ^ other.addr) & self.mask & other.mask == 0
+    
+    @staticmethod
+    def parse(raw: dict):
+        if type(raw) is not dict:
+            raise ValueError("Invalid address map entry")
+        return MapEntry(raw["addr"], raw["mask"])
+
+
+def _decode_trie(entries: list[tuple[int, MapEntry]], path: list[tuple[int, int]], out: list):
+    """Split `entries` on the address bit that separates them best; record the tested bits per device in `out`."""
+    if len(entries) <= 1:
+        # Every tested bit stays in the term, even bits the device ignores: they keep the other devices out.
+        for i, ent in entries:
+            out[i].append(path)
+        return
+    tested = [x[0] for x in path]
+    best   = None
+    for bit in range(max(ent.mask for _, ent in entries).bit_length()):
+        if bit in tested: continue
+        ones   = sum(1 for _, ent in entries if ent.mask >> bit & 1 and ent.addr >> bit & 1)
+        zeroes = sum(1 for _, ent in entries if ent.mask >> bit & 1 and not ent.addr >> bit & 1)
+        # Prefer bits that every entry decodes, then the most even split.
+        score  = (ones + zeroes, min(ones, zeroes))
+        if ones and zeroes and (best is None or score > best[0]):
+            best = (score, bit)
+    bit = best[1]
+    for val in [0, 1]:
+        side = [(i, ent) for i, ent in entries if not ent.mask >> bit & 1 or (ent.addr >> bit & 1) == val]
+        _decode_trie(side, path + [(bit, val)], out)
+
+def compile_static_map(entries: list[MapEntry], width: int, exact: bool = True) -> list[list[tuple[int, int]]]:
+    """
+    Compile a fixed address map into a decoder.
+    Returns, per device, a list of (mask, value) product terms that select it when any matches.
+    Without `exact`, only the address bits needed to tell devices apart are decoded.
+    """
+    for i in range(len(entries)):
+        if entries[i].addr & ~entries[i].mask:
+            raise ValueError(f"Address map entry {i} has base address bits outside its mask")
+        if (entries[i].addr | entries[i].mask) >> width:
+            raise ValueError(f"Address map entry {i} does not fit in {width} address bits")
+        for j in range(i):
+            if entries[i].overlaps(entries[j]):
+                raise ValueError(f"Address map entries {j} and {i} overlap")
+    if exact:
+        return [[(ent.mask, ent.addr)] for ent in entries]
+    paths = [[] for _ in entries]
+    _decode_trie(list(enumerate(entries)), [], paths)
+    terms = []
+    for dev in paths:
+        dev_terms = [(sum(1 << b for b, _ in path), sum(v << b for b, v in path)) for path in dev]
+        # Leaves of the trie are disjoint; merge those of one device that differ in a single bit.
+        merged = True
+        while merged:
+            merged = False
+            for a in range(len(dev_terms)):
+                for b in range(a):
+                    (mask, x), (other, y) = dev_terms[a], dev_terms[b]
+                    diff = x ^ y
+                    if mask == other and diff & (diff - 1) == 0:
+                        dev_terms[b] = (mask & ~diff, x & ~diff)
+                        del dev_terms[a]
+                        merged = True
+                        break
+                if merged: break
+        terms.append(dev_terms)
+    return terms
+
+
 class BusInstance:
     __repr__ = reflect_repr
     def __init__(self, id: str, desc: str, bus: AsymmetricBus, is_ctl: bool, count: Expression = Expression("const", 1)):
@@ -382,7 +578,7 @@ class GenBlock:
 class Block:
     def __init__(self, body: list = [], clock: str = None):
         self.body  = body
-        self.clock = None
+        self.clock = clock
 
 
 class Assign:
@@ -438,14 +634,67 @@ class Instance:
         self.signals = signals
 
 
-def HuPipelineReg(typ: str, id: str, depth: Expression, clk: Expression, d: Expression, q: Expression):
-    return Instance("hu_pipeline_reg", id, None, {"regtype": typ, "depth": depth}, {"clk": clk, "d": d, "q": q})
+def HuPipelineReg(typ: str, id: str, depth: Expression, clk: Expression, d: Expression, q: Expression, en: Expression = None, ready: Expression = None, skid: bool = False, valid: Expression = None):
+    params  = {"regtype": typ, "depth": depth}
+    signals = {"clk": clk}
+    if skid:
+        params["skid"] = Expression("const", 1)
+    if en:
+        signals["en"] = en
+    if ready:
+        signals["ready"] = ready
+    if valid:
+        signals["valid"] = valid
+    signals["d"] = d
+    signals["q"] = q
+    return Instance("hu_pipeline_reg", id, None, params, signals)
 
 
 def HuSelector(typ: str, id: str, width: Expression, sel: Expression, d: Expression, q: Expression):
     return Instance("hu_selector", id, None, {"seltype": typ, "width": width}, {"sel": sel, "d": d, "q": q})
 
 
+def HuFifo(typ: str, id: str, depth: Expression, clk: Expression, push: Expression, d: Expression, full: Expression, pop: Expression, q: Expression, empty: Expression):
+    signals = {"clk": clk, "push": push, "d": d}
+    if full:
+        signals["full"] = full
+    signals["pop"] = pop
+    if q:
+        signals["q"] = q
+    signals["empty"] = empty
+    return Instance("hu_fifo", id, None, {"regtype": typ, "depth": depth}, signals)
+
+
+def HuAsyncFifo(typ: str, id: str, depth: Expression, sync_stages: Expression, wr_clk: Expression, push: Expression, d: Expression, rd_clk: Expression, pop: Expression, q: Expression, empty: Expression, full: Expression = None, wr_count: Expression = None):
+    signals = {"wr_clk": wr_clk, "push": push, "d": d}
+    if full:
+        signals["full"] = full
+    if wr_count:
+        signals["wr_count"] = wr_count
+    signals["rd_clk"] = rd_clk
+    signals["pop"]    = pop
+    signals["q"]      = q
+    signals["empty"]  = empty
+    return Instance("hu_async_fifo", id, None, {"regtype": typ, "depth": depth, "sync_stages": sync_stages}, signals)
+
+
+def HuTreeSelector(typ: str, id: str, width: Expression, stage_every: Expression, clk: Expression, sel: Expression, d: Expression, q: Expression, en: Expression = None):
+    signals = {"clk": clk}
+    if en:
+        signals["en"] = en
+    signals["sel"] = sel
+    signals["d"]   = d
+    signals["q"]   = q
+    return Instance("hu_tree_selector", id, None, {"seltype": typ, "width": width, "stage_every": stage_every}, signals)
+
+
+def tree_selector_latency(width: Expression, stage_every: int) -> Expression:
+    """Number of clock cycles added by a hu_tree_selector with `width` inputs."""
+    if stage_every <= 0:
+        return Expression("const", 0)
+    return Expression("$div", [Expression("$clog2", [width]), Expression("const", stage_every)])
+
+
 class ActiveEntity:
     __repr__ = reflect_repr
     def __init__(self):
@@ -457,6 +706,9 @@ class ActiveEntity:
         pass
     def generate(self):
         raise NotImplementedError()
+    def timing(self) -> dict[str, Expression]:
+        """Time from request to each return signal at the controller port, after `generate`."""
+        return {}
 
 
 class Crossbar(ActiveEntity):
@@ -497,7 +749,7 @@ class Crossbar(ActiveEntity):
 
 class BusMux(ActiveEntity):
     __repr__ = reflect_repr
-    def __init__(self, id: str, desc: str, busid: str, dev_count: str|None, ctl_port: str, dev_port: str):
+    def __init__(self, id: str, desc: str, busid: str, dev_count: str|None, ctl_port: str, dev_port: str, selector: str = "auto", tree_threshold: int = 8, tree_stages: int = 0, skid: bool = False, mode: str = "fixed", fifo_depth: int = 4, static_map: list[MapEntry]|None = None, static_decode: str = "exact"):
         self.id        = id
         self.desc      = desc
         self.busid     = busid
@@ -506,13 +758,35 @@ class BusMux(ActiveEntity):
         self.dev_count = dev_count
         self.ctl_port  = ctl_port
         self.dev_port  = dev_port
+        self.selector  = selector
+        self.tree_threshold = tree_threshold
+        self.tree_stages    = tree_stages
+        self.skid      = skid
+        self.mode      = mode
+        self.fifo_depth = fifo_depth
+        self.static_map = static_map
+        self.static_decode = static_decode
         self.params    = []
         self.signals   = []
         self.body      = []
         self.vars      = {}
+        self.times     = {}
     
     def analyze(self, map: dict):
+        if self.selector not in ["auto", "linear", "tree"]:
+            raise ValueError("Invalid selector type")
+        if self.mode not in ["fixed", "fifo"]:
+            raise ValueError("Invalid multiplexer mode")
         self.bus       = map[self.busid]
+        if self.mode == "fifo" and self.bus.trans.response is None:
+            raise ValueError("FIFO multiplexer mode requires a transaction response")
+        if self.skid and self.mode != "fifo":
+            # A request waiting in the skid buffer would return later than the controller expects.
+            raise ValueError("Skid buffers only apply to FIFO multiplexer mode")
+        if self.skid and not self.bus.trans.accept.vars:
+            raise ValueError("Skid buffers require a transaction accept signal")
+        if self.static_decode not in ["exact", "minimal"]:
+            raise ValueError("Invalid static decode type")
         self.dev_count = self.dev_count or self.bus.dev + "_count"
         self.addr      = self.bus.getsignal(self.bus.addr)
         for param in self.bus.params:
@@ -526,12 +800,22 @@ class BusMux(ActiveEntity):
             raw["bus"],
             raw["dev_count"] if "dev_count" in raw else None,
             raw["ctl_port"] if "ctl_port" in raw else "ctl",
-            raw["dev_port"] if "dev_port" in raw else "dev"
+            raw["dev_port"] if "dev_port" in raw else "dev",
+            raw["selector"] if "selector" in raw else "auto",
+            raw["tree_threshold"] if "tree_threshold" in raw else 8,
+            raw["tree_stages"] if "tree_stages" in raw else 0,
+            raw["skid"] if "skid" in raw else False,
+            raw["mode"] if "mode" in raw else "fixed",
+            raw["fifo_depth"] if "fifo_depth" in raw else 4,
+            [MapEntry.parse(x) for x in raw["static_map"]] if "static_map" in raw else None,
+            raw["static_decode"] if "static_decode" in raw else "exact"
         )
     
     def generate(self):
         # Module definition.
-        self.params.append(Parameter(self.dev_count, f"Number of {self.bus.ctl} ports.", Expression("const", 2)))
+        # The device count of a fixed address map is part of the map, so it cannot be overridden.
+        devs = len(self.static_map) if self.static_map else 2
+        self.params.append(Parameter(self.dev_count, f"Number of {self.bus.ctl} ports.", Expression("const", devs), bool(self.static_map)))
         if self.bus.clk.typ == "ext_clock":
             clock = Signal(self.bus.clk.sigid, "Pipeline clock.", Span.default())
             self.signals.append(clock)
@@ -540,51 +824,70 @@ class BusMux(ActiveEntity):
         self.signals.append(BusInstance(self.ctl_port, "Controller port.", self.bus, False))
         self.signals.append(BusInstance(self.dev_port, "Device ports.", self.bus, True, Expression("var", self.dev_count)))
         
-        # Addressing logic.
-        self.signals.append(Signal(f"map_addr", "Base addresses.", self.addr.span, Expression("var", self.dev_count)))
-        self.signals.append(Signal(f"map_mask", "Address bitmasks.", self.addr.span, Expression("var", self.dev_count)))
+        # Requests go through the skid buffer first, if there is one.
+        requests = [v for v in self.bus.signals if v.dir == "output"]
         self.body.append(GenVar("x"))
+        if self.skid:
+            self.generate_skid(clock, requests)
+        
+        # Addressing logic.
         self.body.append(Signal(f"{self.dev_port}_sel", "Selected device.", Span(Expression("var", self.dev_count))))
-        self.body.append(GenBlock([
-            For.simple("x", Expression("var", self.dev_count), [
-                Assign(f"{self.dev_port}_sel[x]", Expression("$eq", [
-                    Expression("$andb", [
-                        Expression("$index", [Expression("var", "map_addr"), Expression("var", "x")]),
-                        Expression("$index", [Expression("var", "map_mask"), Expression("var", "x")])
-                    ]),
-                    Expression("$andb", [
-                        Expression(f"{self.ctl_port}[x].{self.bus.addr}"),
-                        Expression("$index", [Expression("var", "map_mask"), Expression("var", "x")])
-                    ])
-                ]))
-            ])
-        ]))
+        if self.static_map:
+            self.body.append(GenBlock(self.generate_static_decode()))
+        else:
+            self.generate_decode()
+        
+        # Transaction tracking; return data follows the device that took the request, whatever is selected since.
+        if self.mode == "fixed":
+            self.body.append(Signal(f"{self.dev_port}_sel_req", "Selected device of accepted requests.", Span(Expression("var", self.dev_count))))
+            self.body.append(Assign(f"{self.dev_port}_sel_req", Expression("$if", [
+                self.issued(),
+                Expression("var", f"{self.dev_port}_sel"),
+                Expression("const", 0)
+            ])))
+        else:
+            self.body.append(Signal(f"{self.dev_port}_full", "Too many requests in flight.", Span.default()))
         
         # Outgoing connections.
         ls = []
-        for v in self.bus.signals:
-            if v.dir != "output": continue
+        for v in requests:
             if v.masked:
+                cond = Expression("$index", [Expression("var", f"{self.dev_port}_sel"), Expression("var", "x")])
+                if self.mode == "fifo":
+                    cond = Expression("$and", [cond, Expression("$not", [Expression("var", f"{self.dev_port}_full")])])
                 ls.append(Assign(f"{self.dev_port}[x].{v.id}", Expression("$if", [
-                    Expression("$index", [Expression("var", f"{self.dev_port}_sel"), Expression("var", "x")]),
-                    Expression(f"{self.ctl_port}[x].{v.id}"),
+                    cond,
+                    self.request(v),
                     Expression("const", 0)
                 ])))
             else:
-                ls.append(Assign(f"{self.dev_port}[x].{v.id}", Expression(f"{self.ctl_port}[x].{v.id}")))
+                ls.append(Assign(f"{self.dev_port}[x].{v.id}", self.request(v)))
         self.body.append(GenBlock([For.simple("x", Expression("var", self.dev_count), ls)]))
         
         # Return connections.
+        controls = self.bus.controls()
+        response = self.bus.trans.response.vars if self.mode == "fifo" else []
+        buffered = [v for v in self.bus.signals if v.dir == "input" and v.id not in controls and v.id not in response] if self.mode == "fifo" else []
         for v in self.bus.signals:
-            if v.dir != "input": continue
+            if v.dir != "input" or v.id in response: continue
             self.body.append(Signal(f"raw_{v.id}", "Raw return signals.", v.span, Expression("var", self.dev_count)))
+        if self.mode == "fifo":
+            self.generate_fifo(clock, buffered)
         ls = []
         for v in self.bus.signals:
-            if v.dir != "input": continue
-            ls.append(Assign(f"raw_{v.id}[x]", Expression(f"{self.dev_port}[x].{v.id}")))
+            if v.dir != "input" or v.id in response: continue
+            if v in buffered:
+                ls.append(Assign(f"raw_{v.id}[x]", _unpack(f"{self.dev_port}_buf_q[x]", buffered, v)))
+            else:
+                ls.append(Assign(f"raw_{v.id}[x]", Expression(f"{self.dev_port}[x].{v.id}")))
         self.body.append(GenBlock([For.simple("x", Expression("var", self.dev_count), ls)]))
         for v in self.bus.signals:
             if v.dir != "input": continue
+            # Handshake signals follow the current selection.
+            control = v.id in controls
+            if self.mode == "fifo":
+                self.generate_fifo_return(v, clock, control)
+                continue
             span = Span(Expression("var", self.dev_count))
             self.body.append(Signal(f"{self.dev_port}_sel_{v.id}", "Delayed selector signals.", span))
             self.body.append(HuPipelineReg(
@@ -592,27 +895,725 @@ class BusMux(ActiveEntity):
                 f"plr_{v.id}",
                 v.time if v.time else Expression("const", 0),
                 Expression("var", clock.id),
-                Expression("var", f"{self.dev_port}_sel"),
+                Expression("var", f"{self.dev_port}_sel" if control else f"{self.dev_port}_sel_req"),
                 Expression("var", f"{self.dev_port}_sel_{v.id}")
             ))
-            self.body.append(HuSelector(
-                Expression("$slice", [Expression("bit"), v.span.msb, v.span.lsb]),
-                f"sel_{v.id}",
-                Expression("var", self.dev_count),
-                Expression("var", f"{self.dev_port}_sel_{v.id}"),
-                Expression("var", f"raw_{v.id}"),
-                Expression("var", f"{self.ctl_port}.{v.id}")
+            selector = "linear" if control else self.selector
+            self.body += self.generate_selector(v, clock, selector)
+            self.times[v.id] = Expression("$add", [v.time, self.selector_latency(selector)])
+        if self.skid:
+            # The selected device takes the request in the skid buffer.
+            trans = self.bus.trans
+            self.body.append(Assign(f"{self.dev_port}_issue", Expression("$and", [
+                Expression("$and", [
+                    trans.request.subst({v.id: self.request(v) for v in requests}),
+                    trans.accept.subst({x: Expression("var", f"ret_{x}") for x in controls})
+                ]),
+                Expression("$not", [Expression("var", f"{self.dev_port}_full")])
+            ])))
+    
+    def generate_skid(self, clock: Signal, requests: list[Signal]):
+        """
+        Skid buffer on the request path, so the controller sees a registered accept.
+        A request accepted from the controller but not taken by its device waits in the buffer until it is.
+        """
+        span = Span(_packed_width(requests))
+        self.body.append(Signal(f"{self.dev_port}_req_d", "Request from the controller.", span))
+        self.body.append(Signal(f"{self.dev_port}_req_q", "Request presented to the devices.", span))
+        self.body.append(Signal(f"{self.dev_port}_ready", "The skid buffer is empty, so the controller's request is accepted.", Span.default()))
+        self.body.append(Signal(f"{self.dev_port}_issue", "A device takes the presented request.", Span.default()))
+        self.body.append(GenBlock(_pack(f"{self.dev_port}_req_d", requests, self.ctl_port, self.vars)))
+        self.body.append(HuPipelineReg(
+            Expression("$slice", [Expression("bit"), span.msb, span.lsb]),
+            "skid_req",
+            Expression("const", 0),
+            Expression("var", clock.id),
+            Expression("var", f"{self.dev_port}_req_d"),
+            Expression("var", f"{self.dev_port}_req_q"),
+            Expression("var", f"{self.dev_port}_issue"),
+            Expression("var", f"{self.dev_port}_ready"),
+            True,
+            self.bus.port_expr(self.bus.trans.request, self.ctl_port)
+        ))
+    
+    def request(self, v: Signal) -> Expression:
+        """Request signal `v` as presented to the devices."""
+        if self.skid:
+            return _unpack(f"{self.dev_port}_req_q", [x for x in self.bus.signals if x.dir == "output"], v)
+        return Expression(f"{self.ctl_port}.{v.id}")
+    
+    def issued(self) -> Expression:
+        """Condition under which a device takes the presented request."""
+        if self.skid:
+            return Expression("var", f"{self.dev_port}_issue")
+        return self.bus.accepted(self.ctl_port)
+    
+    def generate_decode(self):
+        self.signals.append(Signal(f"map_addr", "Base addresses.", self.addr.span, Expression("var", self.dev_count)))
+        self.signals.append(Signal(f"map_mask", "Address bitmasks.", self.addr.span, Expression("var", self.dev_count)))
+        self.body.append(GenBlock([
+            For.simple("x", Expression("var", self.dev_count), [
+                Assign(f"{self.dev_port}_sel[x]", Expression("$eq", [
+                    Expression("$andb", [
+                        Expression("$index", [Expression("var", "map_addr"), Expression("var", "x")]),
+                        Expression("$index", [Expression("var", "map_mask"), Expression("var", "x")])
+                    ]),
+                    Expression("$andb", [
+                        self.request(self.addr),
+                        Expression("$index", [Expression("var", "map_mask"), Expression("var", "x")])
+                    ])
+                ]))
+            ])
+        ]))
+    
+    def addr_width(self) -> int:
+        """Width of the address signal for the bus's default parameters."""
+        defaults = {param.id: param.default.eval() for param in self.bus.params}
+        return self.addr.span.msb.eval(defaults) - self.addr.span.lsb.eval(defaults) + 1
+    
+    def generate_static_decode(self) -> list:
+        """Decoder for an address map fixed at generation time."""
+        width    = self.addr_width()
+        terms    = compile_static_map(self.static_map, width, self.static_decode == "exact")
+        addr     = self.request(self.addr)
+        ls       = []
+        for i in range(len(terms)):
+            cond = None
+            for mask, value in terms[i]:
+                if mask:
+                    term = Expression("$eq", [
+                        Expression("$andb", [addr, Expression(f"{width}'h{mask:x}")]),
+                        Expression(f"{width}'h{value:x}")
+                    ])
+                else:
+                    term = Expression("const", 1)
+                cond = Expression("$or", [cond, term]) if cond else term
+            ls.append(Assign(f"{self.dev_port}_sel[{i}]", cond))
+        return ls
+    
+    def generate_fifo(self, clock: Signal, buffered: list[Signal]):
+        """
+        Track the device of each accepted request so variable-latency returns are delivered in order.
+        Devices do not hold their responses, so each device's responses are buffered until it is their turn;
+        the buffers cannot overflow because every device gets at most `fifo_depth` requests in flight.
+        """
+        trans = self.bus.trans
+        sel   = Expression("var", f"{self.dev_port}_sel")
+        span  = Span(Expression("var", self.dev_count))
+        typ   = Expression("$slice", [Expression("bit"), span.msb, span.lsb])
+        head  = Expression("var", f"{self.dev_port}_sel_head")
+        self.body.append(Signal(f"{self.dev_port}_sel_head", "Device of the oldest outstanding request.", span))
+        self.body.append(Signal(f"{self.dev_port}_empty", "No requests in flight.", Span.default()))
+        self.body.append(Signal(f"{self.dev_port}_resp", "Devices presenting a response.", span))
+        self.body.append(Signal(f"{self.dev_port}_buf_empty", "Devices without buffered responses.", span))
+        self.body.append(Signal(f"{self.dev_port}_valid", "The oldest outstanding request has its response buffered.", Span.default()))
+        self.body.append(HuFifo(
+            typ,
+            "sel_fifo",
+            Expression("const", self.fifo_depth),
+            Expression("var", clock.id),
+            self.issued(),
+            sel,
+            Expression("var", f"{self.dev_port}_full"),
+            Expression("var", f"{self.dev_port}_valid"),
+            head,
+            Expression("var", f"{self.dev_port}_empty")
+        ))
+        
+        # Response buffers.
+        buf_span = Span(_packed_width(buffered)) if buffered else Span.default()
+        if buffered:
+            self.body.append(Signal(f"{self.dev_port}_buf_d", "Response data taken from each device.", buf_span, Expression("var", self.dev_count)))
+            self.body.append(Signal(f"{self.dev_port}_buf_q", "Oldest buffered response data of each device.", buf_span, Expression("var", self.dev_count)))
+        ls = [Assign(f"{self.dev_port}_resp[x]", self.bus.port_expr(trans.response, f"{self.dev_port}[x]"))]
+        if buffered:
+            ls += _pack(f"{self.dev_port}_buf_d[x]", buffered, f"{self.dev_port}[x]", self.vars)
+        ls.append(HuFifo(
+            Expression("$slice", [Expression("bit"), buf_span.msb, buf_span.lsb]),
+            "resp_fifo",
+            Expression("const", self.fifo_depth),
+            Expression("var", clock.id),
+            Expression(f"{self.dev_port}_resp[x]"),
+            Expression(f"{self.dev_port}_buf_d[x]") if buffered else Expression("const", 0),
+            None,
+            Expression("$and", [Expression("var", f"{self.dev_port}_valid"), Expression("$index", [head, Expression("var", "x")])]),
+            Expression(f"{self.dev_port}_buf_q[x]") if buffered else None,
+            Expression(f"{self.dev_port}_buf_empty[x]")
+        ))
+        self.body.append(GenBlock([For.simple("x", Expression("var", self.dev_count), ls)]))
+        self.body.append(Assign(f"{self.dev_port}_valid", Expression("$and", [
+            Expression("$not", [Expression("var", f"{self.dev_port}_empty")]),
+            Expression("$ne", [
+                Expression("$andb", [head, Expression("$notb", [Expression("var", f"{self.dev_port}_buf_empty")])]),
+                Expression("const", 0)
+            ])
+        ])))
+        
+        # The response flag leaves with the data, after the selectors.
+        latency = self.selector_latency()
+        if latency.typ == "const" and not latency.args:
+            valid = Expression("var", f"{self.dev_port}_valid")
+        else:
+            valid = Expression("var", f"{self.dev_port}_valid_q")
+            self.body.append(Signal(f"{self.dev_port}_valid_q", "Response flag delayed by the selectors.", Span.default()))
+            self.body.append(HuPipelineReg(Expression("$slice", [Expression("bit"), Expression("const", 0), Expression("const", 0)]), "plr_valid", latency, Expression("var", clock.id), Expression("var", f"{self.dev_port}_valid"), valid))
+        for x in trans.response.vars:
+            self.body.append(Assign(f"{self.ctl_port}.{x}", valid))
+    
+    def generate_fifo_return(self, v: Signal, clock: Signal, control: bool):
+        if v.id in self.bus.trans.response.vars:
+            self.times[v.id] = Expression("$add", [v.time, Expression("$add", [Expression("const", 1), self.selector_latency()])])
+            return
+        elif not control:
+            # Responses spend one cycle in the buffers.
+            self.body += self.generate_selector(v, clock, None, f"{self.dev_port}_sel_head")
+            self.times[v.id] = Expression("$add", [v.time, Expression("$add", [Expression("const", 1), self.selector_latency()])])
+            return
+        # Handshake signals also report a full request FIFO, or with a skid buffer only whether it is empty.
+        full = Expression("var", f"{self.dev_port}_full")
+        self.body.append(Signal(f"ret_{v.id}", "Selected return signal.", v.span))
+        self.body += self.generate_selector(v, clock, "linear", f"{self.dev_port}_sel", f"ret_{v.id}")
+        if self.skid:
+            val = Expression("var", f"{self.dev_port}_ready")
+            if v.id in self.bus.trans.stall.vars:
+                val = Expression("$not", [val])
+        elif v.id in self.bus.trans.stall.vars:
+            val = Expression("$orb", [Expression("var", f"ret_{v.id}"), full])
+        else:
+            val = Expression("$andb", [Expression("var", f"ret_{v.id}"), Expression("$not", [full])])
+        self.body.append(Assign(f"{self.ctl_port}.{v.id}", val))
+        self.times[v.id] = v.time
+    
+    def timing(self) -> dict[str, Expression]:
+        return self.times
+    
+    def selector_latency(self, selector: str = None) -> Expression:
+        """Number of clock cycles the return path selectors add on top of `Signal.time`."""
+        selector = selector or self.selector
+        tree = tree_selector_latency(Expression("var", self.dev_count), self.tree_stages)
+        if selector == "linear" or tree.typ == "const":
+            return Expression("const", 0)
+        elif selector == "tree":
+            return tree
+        return Expression("$if", [
+            Expression("$gt", [Expression("var", self.dev_count), Expression("const", self.tree_threshold)]),
+            tree,
+            Expression("const", 0)
+        ])
+    
+    def generate_selector(self, v: Signal, clock: Signal, selector: str = None, sel: str = None, q: str = None) -> list:
+        selector = selector or self.selector
+        sel      = sel or f"{self.dev_port}_sel_{v.id}"
+        q        = q or f"{self.ctl_port}.{v.id}"
+        typ    = Expression("$slice", [Expression("bit"), v.span.msb, v.span.lsb])
+        linear = HuSelector(
+            typ,
+            f"sel_{v.id}",
+            Expression("var", self.dev_count),
+            Expression("var", sel),
+            Expression("var", f"raw_{v.id}"),
+            Expression("var", q)
+        )
+        tree   = HuTreeSelector(
+            typ,
+            f"sel_{v.id}",
+            Expression("var", self.dev_count),
+            Expression("const", self.tree_stages),
+            Expression("var", clock.id),
+            Expression("var", sel),
+            Expression("var", f"raw_{v.id}"),
+            Expression("var", q)
+        )
+        if selector == "linear":
+            return [linear]
+        elif selector == "tree":
+            return [tree]
+        # Pick the balanced tree once the linear OR chain gets too long.
+        return [GenBlock([
+            If(Expression("$gt", [Expression("var", self.dev_count), Expression("const", self.tree_threshold)]), [tree]).Else([linear])
+        ])]
+
+
+def _packed_width(signals: list[Signal]) -> Expression:
+    """Total width of `signals` packed into one vector."""
+    width = Expression("const", 0)
+    for v in signals:
+        width = fold(Expression("$add", [width, span_width(v.span)]))
+    return width
+
+def _pack(name: str, signals: list[Signal], port: str, vars: dict) -> list:
+    """Assignments packing `signals` of bus instance `port` into vector `name`, first signal in the least significant bits."""
+    offset = Expression("const", 0)
+    ls     = []
+    for v in signals:
+        width = span_width(v.span)
+        if width.typ == "const" and width.args == 1:
+            target = f"{name}[{offset.build(vars)}]"
+        else:
+            msb    = fold(Expression("$sub", [Expression("$add", [offset, width]), Expression("const", 1)]))
+            target = f"{name}[{msb.build(vars)}:{offset.build(vars)}]"
+        ls.append(Assign(target, Expression(f"{port}.{v.id}")))
+        offset = fold(Expression("$add", [offset, width]))
+    return ls
+
+def _unpack(name: str, signals: list[Signal], v: Signal) -> Expression:
+    """Signal `v` read back from vector `name` holding `signals` packed by `_pack`."""
+    offset = _packed_width(signals[:signals.index(v)])
+    width  = span_width(v.span)
+    if width.typ == "const" and width.args == 1:
+        return Expression("$index", [Expression(name), offset])
+    return Expression("$slice", [Expression(name), fold(Expression("$sub", [Expression("$add", [offset, width]), Expression("const", 1)])), offset])
+
+def _counter(id: str, desc: str, bits: int) -> Signal:
+    """Declaration of a register that starts at zero."""
+    return Signal(id, desc, Span(Expression("const", bits - 1), Expression("const", 0)), init=Expression("const", 0))
+
+
+class Bridge(ActiveEntity):
+    """
+    Clock domain crossing between a controller and a device on different clocks.
+    Requests and responses each pass through an asynchronous FIFO; the device side limits the requests in flight
+    to the free space in the response FIFO, because devices do not hold their responses.
+    """
+    __repr__ = reflect_repr
+    def __init__(self, id: str, desc: str, busid: str, ctl_port: str = "ctl", dev_port: str = "dev", ctl_clock: str = "ctl_clk", dev_clock: str = "dev_clk", depth: int = 4, sync_stages: int = 2):
+        self.id          = id
+        self.desc        = desc
+        self.busid       = busid
+        self.bus: AsymmetricBus = None
+        self.ctl_port    = ctl_port
+        self.dev_port    = dev_port
+        self.ctl_clock   = ctl_clock
+        self.dev_clock   = dev_clock
+        self.depth       = depth
+        self.sync_stages = sync_stages
+        self.params      = []
+        self.signals     = []
+        self.body        = []
+        self.vars        = {}
+        self.times       = {}
+    
+    def analyze(self, map: dict):
+        self.bus = map[self.busid]
+        trans    = self.bus.trans
+        if self.depth < 2 or self.depth & (self.depth - 1):
+            raise ValueError("Bridge FIFO depth must be a power of two")
+        if self.sync_stages < 2:
+            raise ValueError("Bridges need at least two synchronizer stages")
+        if trans.response is None:
+            raise ValueError("Bridges require a transaction response")
+        if not [x for x in trans.accept.vars if x not in trans.stall.vars]:
+            raise ValueError("Bridges require a transaction accept signal")
+        if self.bus.clk.typ == "bus_clock":
+            self.ctl_clock = f"{self.ctl_port}.{self.bus.clk.sigid}"
+            self.dev_clock = f"{self.dev_port}.{self.bus.clk.sigid}"
+            self.vars[self.ctl_clock] = self.ctl_clock
+            self.vars[self.dev_clock] = self.dev_clock
+        for param in self.bus.params:
+            self.vars[param.id] = f"{self.ctl_port}.{param.id}"
+    
+    @staticmethod
+    def parse(id: str, raw: dict):
+        return Bridge(
+            id,
+            raw["desc"] if "desc" in raw else None,
+            raw["bus"],
+            raw["ctl_port"] if "ctl_port" in raw else "ctl",
+            raw["dev_port"] if "dev_port" in raw else "dev",
+            raw["ctl_clock"] if "ctl_clock" in raw else "ctl_clk",
+            raw["dev_clock"] if "dev_clock" in raw else "dev_clk",
+            raw["depth"] if "depth" in raw else 4,
+            raw["sync_stages"] if "sync_stages" in raw else 2
+        )
+    
+    def generate(self):
+        trans    = self.bus.trans
+        controls = self.bus.controls()
+        requests = [v for v in self.bus.signals if v.dir == "output"]
+        data     = [v for v in self.bus.signals if v.dir == "input" and v.id not in controls and v.id not in trans.response.vars]
+        abits    = (self.depth - 1).bit_length()
+        depth    = Expression("const", self.depth)
+        sync     = Expression("const", self.sync_stages)
+        ctl_clk  = Expression(self.ctl_clock)
+        dev_clk  = Expression(self.dev_clock)
+        
+        # Module definition.
+        if self.bus.clk.typ == "ext_clock":
+            self.signals.append(Signal(self.ctl_clock, "Controller side clock.", Span.default()))
+            self.signals.append(Signal(self.dev_clock, "Device side clock.", Span.default()))
+        self.signals.append(BusInstance(self.ctl_port, "Controller port.", self.bus, False))
+        self.signals.append(BusInstance(self.dev_port, "Device port.", self.bus, True))
+        
+        # Request path.
+        req_span = Span(_packed_width(requests))
+        self.body.append(Signal("req_d", "Request written to the FIFO.", req_span))
+        self.body.append(Signal("req_q", "Oldest request in the FIFO.", req_span))
+        self.body.append(Signal("req_full", "The request FIFO cannot take another request.", Span.default()))
+        self.body.append(Signal("req_empty", "No requests waiting for the device.", Span.default()))
+        self.body.append(Signal("dev_hold", "Requests are held back from the device.", Span.default()))
+        self.body.append(GenBlock(_pack("req_d", requests, self.ctl_port, self.vars)))
+        self.body.append(HuAsyncFifo(
+            Expression("$slice", [Expression("bit"), req_span.msb, req_span.lsb]),
+            "req_fifo",
+            depth,
+            sync,
+            ctl_clk,
+            self.bus.accepted(self.ctl_port),
+            Expression("var", "req_d"),
+            dev_clk,
+            self.bus.accepted(self.dev_port),
+            Expression("var", "req_q"),
+            Expression("var", "req_empty"),
+            Expression("var", "req_full")
+        ))
+        
+        # The bridge never stalls the controller; a full request FIFO only refuses new requests.
+        for v in self.bus.signals:
+            if v.dir != "input" or v.id not in controls: continue
+            if v.id in trans.stall.vars:
+                self.body.append(Assign(f"{self.ctl_port}.{v.id}", Expression("const", 0)))
+            else:
+                self.body.append(Assign(f"{self.ctl_port}.{v.id}", Expression("$not", [Expression("var", "req_full")])))
+        
+        # Device side; a request may only be issued if the response FIFO has room for its response.
+        self.body.append(_counter("dev_inflight", "Requests issued to the device and not answered yet.", abits + 1))
+        self.body.append(Signal("resp_count", "Responses in the FIFO as seen from the device side.", Span(Expression("const", abits + 1))))
+        self.body.append(Signal("resp_push", "Response taken from the device.", Span.default()))
+        self.body.append(Assign("dev_hold", Expression("$or", [
+            Expression("var", "req_empty"),
+            Expression("$ge", [Expression("$add", [Expression("dev_inflight"), Expression("var", "resp_count")]), depth])
+        ])))
+        for v in requests:
+            value = _unpack("req_q", requests, v)
+            if v.masked or v.id in trans.request.vars:
+                value = Expression("$if", [Expression("$not", [Expression("var", "dev_hold")]), value, Expression("const", 0)])
+            self.body.append(Assign(f"{self.dev_port}.{v.id}", value))
+        # Responses arrive regardless of stalls, which only hold back requests.
+        self.body.append(Assign("resp_push", self.bus.port_expr(trans.response, self.dev_port)))
+        self.body.append(Block([
+            Assign("dev_inflight", Expression("$sub", [
+                Expression("$add", [Expression("dev_inflight"), self.bus.accepted(self.dev_port)]),
+                Expression("var", "resp_push")
+            ]))
+        ], dev_clk.args))
+        
+        # Response path.
+        resp_span = Span(_packed_width(data)) if data else Span.default()
+        self.body.append(Signal("resp_d", "Response written to the FIFO.", resp_span))
+        self.body.append(Signal("resp_q", "Oldest response in the FIFO.", resp_span))
+        self.body.append(Signal("resp_empty", "No responses waiting for the controller.", Span.default()))
+        if data:
+            self.body.append(GenBlock(_pack("resp_d", data, self.dev_port, self.vars)))
+        else:
+            self.body.append(Assign("resp_d", Expression("const", 0)))
+        self.body.append(HuAsyncFifo(
+            Expression("$slice", [Expression("bit"), resp_span.msb, resp_span.lsb]),
+            "resp_fifo",
+            depth,
+            sync,
+            dev_clk,
+            Expression("var", "resp_push"),
+            Expression("var", "resp_d"),
+            ctl_clk,
+            Expression("$not", [Expression("var", "resp_empty")]),
+            Expression("var", "resp_q"),
+            Expression("var", "resp_empty"),
+            None,
+            Expression("var", "resp_count")
+        ))
+        for x in trans.response.vars:
+            self.body.append(Assign(f"{self.ctl_port}.{x}", Expression("$not", [Expression("var", "resp_empty")])))
+        for v in data:
+            self.body.append(Assign(f"{self.ctl_port}.{v.id}", _unpack("resp_q", data, v)))
+        
+        # With equal clocks, each crossing takes one cycle for the FIFO write and one per synchronizer stage.
+        extra = Expression("const", 2 * self.sync_stages + 2)
+        for v in self.bus.signals:
+            if v.dir != "input" or v.id in controls: continue
+            self.times[v.id] = fold(Expression("$add", [v.time, extra]))
+    
+    def timing(self) -> dict[str, Expression]:
+        return self.times
+
+
+class WidthConverter(ActiveEntity):
+    """
+    Connects a controller and a device that use different parameter values of the same bus, where the values change the width of the data signals.
+    Downsizing splits each request into beats at consecutive addresses and merges the returned beats;
+    upsizing sends each request to the containing device word and selects the returned lane. Addresses count data words.
+    Upsizing is read-only, and the device address must be wide enough for every controller address.
+    """
+    __repr__ = reflect_repr
+    def __init__(self, id: str, desc: str, busid: str, ctl_params: dict[str, int], dev_params: dict[str, int], ctl_port: str = "ctl", dev_port: str = "dev", buffered: bool = False, fifo_depth: int = 4):
+        self.id         = id
+        self.desc       = desc
+        self.busid      = busid
+        self.bus: AsymmetricBus = None
+        self.ctl_params = ctl_params
+        self.dev_params = dev_params
+        self.ctl_port   = ctl_port
+        self.dev_port   = dev_port
+        self.buffered   = buffered
+        self.fifo_depth = fifo_depth
+        self.params     = []
+        self.signals    = []
+        self.body       = []
+        self.vars       = {}
+        self.times      = {}
+    
+    def analyze(self, map: dict):
+        self.bus   = map[self.busid]
+        trans      = self.bus.trans
+        self.ctl_values = self.values(self.ctl_params)
+        self.dev_values = self.values(self.dev_params)
+        if self.bus.addr is None:
+            raise ValueError("Width converters require an address signal")
+        self.data  = []
+        ratios     = set()
+        for v in self.bus.signals:
+            if v.id == self.bus.addr: continue
+            ctl, dev = self.width(v, self.ctl_values), self.width(v, self.dev_values)
+            if ctl != dev:
+                self.data.append(v.id)
+                ratios.add((max(ctl, dev) / min(ctl, dev), ctl > dev))
+        if not self.data:
+            raise ValueError("The bus parameters do not change the width of any signal")
+        if len(ratios) != 1:
+            raise ValueError("Data signals must all scale by the same ratio")
+        ratio, self.downsize = next(iter(ratios))
+        self.ratio = int(ratio)
+        if ratio != self.ratio or self.ratio & (self.ratio - 1):
+            raise ValueError("The data width ratio must be a power of two")
+        if not self.downsize and any(v.dir == "output" for v in self.bus.signals if v.id in self.data):
+            # A narrow write would clobber the other lanes of the device word.
+            raise ValueError("Upsizing only supports buses without output data signals")
+        bits     = self.ratio.bit_length() - 1
+        addr     = [v for v in self.bus.signals if v.id == self.bus.addr][0]
+        ctl_addr = self.width(addr, self.ctl_values)
+        dev_addr = self.width(addr, self.dev_values)
+        if (ctl_addr + bits if self.downsize else ctl_addr - bits) > dev_addr:
+            raise ValueError(f"A {ctl_addr}-bit controller address does not fit the {dev_addr}-bit device address")
+        if (self.downsize or trans.response) and not [x for x in trans.accept.vars if x not in trans.stall.vars]:
+            raise ValueError("This width converter requires a transaction accept signal")
+        if any(x in self.data for x in list(trans.stall.vars) + list(trans.accept.vars)):
+            raise ValueError("Handshake signals cannot change width")
+        if self.bus.clk.typ == "bus_clock":
+            self.vars[f"{self.ctl_port}.{self.bus.clk.sigid}"] = f"{self.ctl_port}.{self.bus.clk.sigid}"
+    
+    @staticmethod
+    def parse(id: str, raw: dict):
+        return WidthConverter(
+            id,
+            raw["desc"] if "desc" in raw else None,
+            raw["bus"],
+            raw["ctl_params"] if "ctl_params" in raw else {},
+            raw["dev_params"] if "dev_params" in raw else {},
+            raw["ctl_port"] if "ctl_port" in raw else "ctl",
+            raw["dev_port"] if "dev_port" in raw else "dev",
+            raw["buffered"] if "buffered" in raw else False,
+            raw["fifo_depth"] if "fifo_depth" in raw else 4
+        )
+    
+    def values(self, overrides: dict[str, int]) -> dict[str, Expression]:
+        """Bus parameter values of one side as constant expressions, defaults are used for the rest."""
+        res = {}
+        for param in self.bus.params:
+            res[param.id] = Expression("const", overrides[param.id] if param.id in overrides else param.default.subst(res).eval())
+        for k in overrides:
+            if k not in res:
+                raise ValueError(f"{self.bus.id} has no parameter {k}")
+        return res
+    
+    def width(self, v: Signal, values: dict[str, Expression]) -> int:
+        """Width of `v` for one side's parameter values."""
+        return span_width(v.span).subst(values).eval()
+    
+    def time(self, v: Signal) -> int:
+        """Return time of `v` at the device port."""
+        return v.time.subst(self.dev_values).eval()
+    
+    def generate(self):
+        trans    = self.bus.trans
+        controls = self.bus.controls()
+        bits     = self.ratio.bit_length() - 1
+        
+        # Module definition.
+        if self.bus.clk.typ == "ext_clock":
+            self.signals.append(Signal(self.bus.clk.sigid, "Converter clock.", Span.default()))
+            self.clock = self.bus.clk.sigid
+        else:
+            self.clock = f"{self.ctl_port}.{self.bus.clk.sigid}"
+        self.signals.append(BusInstance(self.ctl_port, "Controller port.", self.bus, False))
+        self.signals.append(BusInstance(self.dev_port, "Device port.", self.bus, True))
+        self.taken   = self.bus.accepted(self.dev_port)
+        if trans.response:
+            # Returns are valid when the device responds; stalls only hold back requests.
+            self.valid = self.bus.port_expr(trans.response, self.dev_port)
+        
+        if self.downsize:
+            self.generate_split(controls, bits)
+        else:
+            self.generate_lanes(controls, bits)
+        
+        for v in self.bus.signals:
+            if v.dir != "input" or v.id in controls: continue
+            self.times[v.id] = Expression("const", self.time(v) + (1 if self.buffered else 0))
+    
+    def generate_split(self, controls: list[str], bits: int):
+        """Downsizing: one request becomes `ratio` device requests; the controller's request is accepted with the last beat."""
+        trans  = self.bus.trans
+        addr   = self.bus.addr
+        self.body.append(_counter("beat", "Beat of the current request sent to the device.", bits))
+        self.body.append(Signal("beat_last", "The last beat of the request is on the device port.", Span.default()))
+        self.body.append(Assign("beat_last", Expression("$eq", [Expression("beat"), Expression("const", self.ratio - 1)])))
+        self.body.append(Block([If(self.taken, [Assign("beat", Expression("$add", [Expression("beat"), Expression("const", 1)]))])], self.clock))
+        
+        # Outgoing connections.
+        for v in self.bus.signals:
+            if v.dir != "output": continue
+            val = Expression(f"{self.ctl_port}.{v.id}")
+            if v.id == addr:
+                val = Expression("$orb", [Expression("$shl", [val, Expression("const", bits)]), Expression("beat")])
+            elif v.id in self.data:
+                val = Expression("$shr", [val, Expression("$mul", [Expression("beat"), Expression("const", self.width(v, self.dev_values))])])
+            self.body.append(Assign(f"{self.dev_port}.{v.id}", val))
+        
+        # Return connections.
+        if trans.response:
+            self.body.append(_counter("ret_beat", "Beat of the next response.", bits))
+            self.body.append(Block([If(self.valid, [Assign("ret_beat", Expression("$add", [Expression("ret_beat"), Expression("const", 1)]))])], self.clock))
+        for v in self.bus.signals:
+            if v.dir != "input": continue
+            val = Expression(f"{self.dev_port}.{v.id}")
+            if v.id in controls:
+                if v.id not in trans.stall.vars:
+                    val = Expression("$andb", [val, Expression("var", "beat_last")])
+                self.body.append(Assign(f"{self.ctl_port}.{v.id}", val))
+                continue
+            elif trans.response and v.id in trans.response.vars:
+                val = Expression("$andb", [val, Expression("$eq", [Expression("ret_beat"), Expression("const", self.ratio - 1)])])
+            elif v.id in self.data:
+                wide   = self.width(v, self.ctl_values)
+                narrow = self.width(v, self.dev_values)
+                valid  = self.valid if trans.response else self.return_valid(v)
+                # Earlier beats shift in from the top; the last beat is taken straight from the device.
+                self.body.append(Signal(f"merge_{v.id}", "Earlier beats of the returned data.", Span(Expression("const", wide - narrow))))
+                self.body.append(Block([If(valid, [Assign(f"merge_{v.id}", Expression("$orb", [
+                    Expression("$shr", [Expression("var", f"merge_{v.id}"), Expression("const", narrow)]),
+                    Expression("$shl", [val, Expression("const", wide - 2 * narrow)])
+                ]))])], self.clock))
+                val = Expression("$orb", [Expression("$shl", [val, Expression("const", wide - narrow)]), Expression("var", f"merge_{v.id}")])
+            self.drive(v, val)
+    
+    def return_valid(self, v: Signal) -> Expression:
+        """Whether a beat of `v` returns this cycle, for buses with a fixed return time."""
+        self.body.append(Signal(f"{v.id}_valid", "A beat returns this cycle.", Span.default()))
+        self.body.append(HuPipelineReg(
+            Expression("$slice", [Expression("bit"), Expression("const", 0), Expression("const", 0)]),
+            f"plr_{v.id}",
+            Expression("const", self.time(v)),
+            Expression(self.clock),
+            self.taken,
+            Expression("var", f"{v.id}_valid")
+        ))
+        return Expression("var", f"{v.id}_valid")
+    
+    def generate_lanes(self, controls: list[str], bits: int):
+        """Upsizing: each request goes to the device word containing it, with the data repeated on every lane."""
+        trans  = self.bus.trans
+        addr   = self.bus.addr
+        span   = Span(Expression("const", bits))
+        typ    = Expression("$slice", [Expression("bit"), span.msb, span.lsb])
+        self.body.append(Signal("lane", "Lane of the device word addressed by the controller.", span))
+        self.body.append(Assign("lane", Expression("$andb", [Expression(f"{self.ctl_port}.{addr}"), Expression("const", self.ratio - 1)])))
+        full = None
+        if trans.response:
+            # Responses take variable time, so the lanes of requests in flight are queued.
+            full = Expression("var", "lane_full")
+            self.body.append(Signal("lane_full", "Too many requests in flight.", Span.default()))
+            self.body.append(Signal("lane_empty", "No requests in flight.", Span.default()))
+            self.body.append(Signal("ret_lane", "Lane of the oldest request in flight.", span))
+            self.body.append(HuFifo(
+                typ,
+                "lane_fifo",
+                Expression("const", self.fifo_depth),
+                Expression(self.clock),
+                self.taken,
+                Expression("var", "lane"),
+                full,
+                self.valid,
+                Expression("var", "ret_lane"),
+                Expression("var", "lane_empty")
             ))
+        
+        # Outgoing connections.
+        for v in self.bus.signals:
+            if v.dir != "output": continue
+            val = Expression(f"{self.ctl_port}.{v.id}")
+            if v.id == addr:
+                val = Expression("$shr", [val, Expression("const", bits)])
+            elif v.id in self.data:
+                narrow = self.width(v, self.ctl_values)
+                res    = val
+                for i in range(1, self.ratio):
+                    res = Expression("$orb", [res, Expression("$shl", [val, Expression("const", i * narrow)])])
+                val = res
+            elif full and (v.masked or v.id in trans.request.vars):
+                val = Expression("$if", [Expression("$not", [full]), val, Expression("const", 0)])
+            self.body.append(Assign(f"{self.dev_port}.{v.id}", val))
+        
+        # Return connections.
+        for v in self.bus.signals:
+            if v.dir != "input": continue
+            val = Expression(f"{self.dev_port}.{v.id}")
+            if v.id in controls:
+                if full and v.id not in trans.stall.vars:
+                    val = Expression("$andb", [val, Expression("$not", [full])])
+                self.body.append(Assign(f"{self.ctl_port}.{v.id}", val))
+                continue
+            elif v.id in self.data:
+                if trans.response:
+                    lane = Expression("var", "ret_lane")
+                else:
+                    lane = Expression("var", f"{v.id}_lane")
+                    self.body.append(Signal(f"{v.id}_lane", "Lane of the returning data.", span))
+                    self.body.append(HuPipelineReg(typ, f"plr_{v.id}", Expression("const", self.time(v)), Expression(self.clock), Expression("var", "lane"), lane))
+                val = Expression("$shr", [val, Expression("$mul", [lane, Expression("const", self.width(v, self.ctl_values))])])
+            self.drive(v, val)
+    
+    def drive(self, v: Signal, val: Expression):
+        """Drive return signal `v` of the controller port, through an output register if buffered."""
+        if not self.buffered:
+            self.body.append(Assign(f"{self.ctl_port}.{v.id}", val))
+            return
+        span = Span(Expression("const", self.width(v, self.ctl_values)))
+        self.body.append(Signal(f"ret_{v.id}", "Return signal before the output register.", span))
+        self.body.append(Assign(f"ret_{v.id}", val))
+        self.body.append(HuPipelineReg(
+            Expression("$slice", [Expression("bit"), span.msb, span.lsb]),
+            f"buf_{v.id}",
+            Expression("const", 1),
+            Expression(self.clock),
+            Expression("var", f"ret_{v.id}"),
+            Expression(f"{self.ctl_port}.{v.id}")
+        ))
+    
+    def timing(self) -> dict[str, Expression]:
+        return self.times
 
 
 parseable = {
     "asymmetric_bus": AsymmetricBus,
     "crossbar": Crossbar,
-    "multiplexer": BusMux
+    "multiplexer": BusMux,
+    "bridge": Bridge,
+    "width_converter": WidthConverter
 }
 
 
 def read_file(path):
+    # PyYAML takes longer to import than the rest of the tool, so only load it to read a file.
+    import yaml
     with open(path, "r") as fd:
         return yaml.safe_load(fd)
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# Cold start benchmark for bustool.py, measured with `python -X importtime`.
+# The budgets in test/startup.json are checked by test.py; `startup.py --update` stores new ones.
+# Budgets are ratios to the time of importing yaml in the same run, so they hold on slower machines too.
+
+import subprocess, json, sys, os
+
+root   = os.path.dirname(os.path.abspath(__file__))
+budget = os.path.join(root, "test", "startup.json")
+
+def import_times(args: list[str]) -> dict[str, int]:
+    """Cumulative import time in microseconds of every top-level import made by a fresh interpreter running `args`."""
+    res   = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=root, capture_output=True, text=True, check=True)
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:"): continue
+        fields = line[len("import time:"):].split("|")
+        # Nested imports are indented below the module that made them.
+        if len(fields) != 3 or not fields[0].strip().isdigit() or fields[2][1:2] == " ": continue
+        times[fields[2].strip()] = times.get(fields[2].strip(), 0) + int(fields[1])
+    return times
+
+def measure(args: list[str], runs: int = 5) -> int:
+    """Best of `runs` import times of `args` in microseconds, not counting the interpreter's own startup imports."""
+    best = None
+    for _ in range(runs):
+        base  = import_times(["-c", "pass"])
+        total = sum(v for k, v in import_times(args).items() if k not in base)
+        best  = total if best is None else min(best, total)
+    return best
+
+baseline = ["-c", "import yaml"]
+
+def check(update: bool = False) -> list[str]:
+    """Measure every benchmark and return those over budget; with `update`, store twice the measured ratios as the new budgets."""
+    with open(budget) as fd:
+        cases = json.load(fd)
+    over = []
+    base = max(1, measure(baseline))
+    for name in cases:
+        time  = measure(cases[name]["args"])
+        ratio = time / base
+        print(f"{name}: {time} us, {ratio:.2f}x baseline, budget {cases[name]['budget_ratio']}x", file=sys.stderr)
+        if update:
+            cases[name]["budget_ratio"] = round(2 * ratio, 2)
+        elif ratio > cases[name]["budget_ratio"]:
+            over.append(name)
+    if update:
+        with open(budget, "w") as fd:
+            json.dump(cases, fd, indent=4)
+            fd.write("\n")
+    return over
+
+if __name__ == "__main__":
+    over = check("--update" in sys.argv[1:])
+    if over:
+        sys.exit("Over the startup budget: " + ", ".join(over))
@@ -0,0 +1,88 @@
+
+// Copyright © 2024, Julian Scheffers, see LICENSE for more information
+
+`timescale 1ns/1ps
+
+module hu_async_fifo#(
+    // Number of entries, must be a power of two.
+    parameter depth       = 4,
+    // Number of synchronizer flip-flops per pointer crossing.
+    parameter sync_stages = 2,
+    // Type of the stored value.
+    type      regtype     = bit[7:0]
+)(
+    // Write side clock.
+    input  wire                     wr_clk,
+    // Append d to the FIFO.
+    input  wire                     push,
+    // Input data.
+    input  regtype                  d,
+    // The FIFO cannot take another entry.
+    output wire                     full,
+    // Number of entries as seen from the write side; may lag behind pops.
+    output wire [$clog2(depth):0]   wr_count,
+    // Read side clock.
+    input  wire                     rd_clk,
+    // Remove the oldest entry.
+    input  wire                     pop,
+    // Oldest entry.
+    output regtype                  q,
+    // The FIFO holds no entries.
+    output wire                     empty
+);
+    localparam abits = $clog2(depth);
+
+    function automatic logic[abits:0] gray2bin(input logic[abits:0] gray);
+        logic[abits:0] bin;
+        bin[abits] = gray[abits];
+        for (integer i = abits - 1; i >= 0; i = i - 1) begin
+            bin[i] = bin[i+1] ^ gray[i];
+        end
+        return bin;
+    endfunction
+
+    genvar x;
+    regtype         mem[depth];
+    // Pointers carry one extra bit to tell a full FIFO from an empty one.
+    logic[abits:0]  wr_bin  = 0;
+    logic[abits:0]  wr_gray = 0;
+    logic[abits:0]  rd_bin  = 0;
+    logic[abits:0]  rd_gray = 0;
+    // Gray-coded pointers synchronized into the other clock domain.
+    logic[abits:0]  rd_sync[sync_stages] = '{default: 0};
+    logic[abits:0]  wr_sync[sync_stages] = '{default: 0};
+
+    generate
+        always @(posedge wr_clk) rd_sync[0] <= rd_gray;
+        always @(posedge rd_clk) wr_sync[0] <= wr_gray;
+        for (x = 1; x < sync_stages; x = x + 1) begin
+            always @(posedge wr_clk) rd_sync[x] <= rd_sync[x-1];
+            always @(posedge rd_clk) wr_sync[x] <= wr_sync[x-1];
+        end
+    endgenerate
+
+    // Write side.
+    wire [abits:0]  wr_next = wr_bin + 1;
+    wire            do_push = push && !full;
+    assign wr_count = wr_bin - gray2bin(rd_sync[sync_stages-1]);
+    assign full     = wr_count == depth;
+    always @(posedge wr_clk) begin
+        if (do_push) begin
+            mem[wr_bin[abits-1:0]] <= d;
+            wr_bin  <= wr_next;
+            wr_gray <= wr_next ^ (wr_next >> 1);
+        end
+    end
+
+    // Read side.
+    wire [abits:0]  rd_next = rd_bin + 1;
+    wire            do_pop  = pop && !empty;
+    assign empty    = rd_gray == wr_sync[sync_stages-1];
+    assign q        = mem[rd_bin[abits-1:0]];
+    always @(posedge rd_clk) begin
+        if (do_pop) begin
+            rd_bin  <= rd_next;
+            rd_gray <= rd_next ^ (rd_next >> 1);
+        end
+    end
+endmodule
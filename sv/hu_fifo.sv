@@ -0,0 +1,47 @@
+
+// Copyright © 2024, Julian Scheffers, see LICENSE for more information
+
+`timescale 1ns/1ps
+
+module hu_fifo#(
+    // Number of entries.
+    parameter depth     = 4,
+    // Type of the stored value.
+    type      regtype   = bit[7:0]
+)(
+    // FIFO clock.
+    input  wire     clk,
+    // Append d to the FIFO.
+    input  wire     push,
+    // Input data.
+    input  regtype  d,
+    // The FIFO cannot take another entry.
+    output wire     full,
+    // Remove the oldest entry.
+    input  wire     pop,
+    // Oldest entry.
+    output regtype  q,
+    // The FIFO holds no entries.
+    output wire     empty
+);
+    localparam abits = depth > 1 ? $clog2(depth) : 1;
+    regtype          mem[depth];
+    logic[abits-1:0] rd    = 0;
+    logic[abits-1:0] wr    = 0;
+    logic[abits:0]   count = 0;
+    wire             do_push = push && !full;
+    wire             do_pop  = pop && !empty;
+    assign full  = count == depth;
+    assign empty = count == 0;
+    assign q     = mem[rd];
+    always @(posedge clk) begin
+        if (do_push) begin
+            mem[wr] <= d;
+            wr      <= wr == depth - 1 ? 0 : wr + 1;
+        end
+        if (do_pop) begin
+            rd      <= rd == depth - 1 ? 0 : rd + 1;
+        end
+        count <= count + do_push - do_pop;
+    end
+endmodule
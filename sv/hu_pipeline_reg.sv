@@ -6,11 +6,19 @@
 module hu_pipeline_reg#(
     // Number of pipeline registers.
     parameter depth     = 1,
+    // Whether to add a skid buffer in front of the pipeline; with depth 0 the buffer is all there is.
+    parameter skid      = 0,
     // Type of the pipeline register.
     type      regtype   = bit[7:0]
 )(
     // Pipeline clock.
     input  wire     clk,
+    // Pipeline enable; the registers hold their value while low. With depth 0, q is taken this cycle.
+    input  wire     en = 1,
+    // Input data will be accepted this cycle.
+    output wire     ready,
+    // Input data is valid; only valid data is caught by the skid buffer.
+    input  wire     valid = 1,
     // Input data.
     input  regtype  d,
     // Output data.
@@ -18,11 +26,32 @@ module hu_pipeline_reg#(
 );
     genvar x;
     regtype regs[depth+1];
-    assign regs[0] = d;
-    assign q = regs[depth];
+    regtype skid_data;
+    logic   skid_valid = 0;
     generate
+        if (skid) begin
+            // Catches the word presented in a cycle the pipeline does not move, so ready can be registered.
+            assign ready   = !skid_valid;
+            assign regs[0] = skid_valid ? skid_data : d;
+            always @(posedge clk) begin
+                if (en) begin
+                    skid_valid <= 0;
+                end else if (!skid_valid && valid) begin
+                    skid_data  <= d;
+                    skid_valid <= 1;
+                end
+            end
+        end else begin
+            assign ready   = en;
+            assign regs[0] = d;
+        end
         for (x = 0; x < depth; x = x + 1) begin
-            assign regs[x+1] = regs[x];
+            always @(posedge clk) begin
+                if (en) begin
+                    regs[x+1] <= regs[x];
+                end
+            end
         end
     endgenerate
+    assign q = regs[depth];
 endmodule
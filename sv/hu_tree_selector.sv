@@ -0,0 +1,57 @@
+
+// Copyright © 2024, Julian Scheffers, see LICENSE for more information
+
+`timescale 1ns/1ps
+
+module hu_tree_selector#(
+    // Number of select bits.
+    parameter width       = 2,
+    // Number of tree levels per pipeline register, 0 for a combinational tree.
+    parameter stage_every = 0,
+    // Type of the selected value.
+    type      seltype     = bit[7:0]
+)(
+    // Pipeline clock.
+    input  wire             clk,
+    // Pipeline enable; the registers hold their value while low.
+    input  wire             en = 1,
+    // Selector.
+    input  wire [width-1:0] sel,
+    // Input data.
+    input  seltype          d[width],
+    // Output data.
+    output seltype          q
+);
+    // Number of levels in the OR tree.
+    localparam levels  = width > 1 ? $clog2(width) : 0;
+    // Number of leaves, rounded up to a power of two.
+    localparam leaves  = 1 << levels;
+    // Number of clock cycles from sel/d to q.
+    localparam latency = stage_every > 0 ? levels / stage_every : 0;
+
+    genvar x, y;
+    seltype tree[levels+1][leaves];
+    generate
+        for (x = 0; x < leaves; x = x + 1) begin
+            if (x < width) begin
+                assign tree[0][x] = sel[x] ? d[x] : 0;
+            end else begin
+                assign tree[0][x] = 0;
+            end
+        end
+        for (y = 0; y < levels; y = y + 1) begin
+            for (x = 0; x < (leaves >> (y + 1)); x = x + 1) begin
+                if (stage_every > 0 && (y + 1) % stage_every == 0) begin
+                    always @(posedge clk) begin
+                        if (en) begin
+                            tree[y+1][x] <= tree[y][2*x] | tree[y][2*x+1];
+                        end
+                    end
+                end else begin
+                    assign tree[y+1][x] = tree[y][2*x] | tree[y][2*x+1];
+                end
+            end
+        end
+    endgenerate
+    assign q = tree[levels][0];
+endmodule
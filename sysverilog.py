@@ -1,6 +1,7 @@
 
 from parser import *
 from writer import *
+from widths import Widths
 
 class Entity:
     def __init__(self, typ: str, id: str, desc: str, params: list[Parameter], signals: list[Signal], body: list, vars: dict[str] = {}):
@@ -10,7 +11,8 @@ class Entity:
         self.params  = params
         self.signals = signals
         self.body    = body
-        self.vars    = vars
+        self.vars    = dict(vars)
+        self.widths  = Widths(params, signals, body)
         for param in self.params:
             if param.id in self.vars:
                 raise ValueError(f"Multiple definitions of {param.id}")
@@ -34,7 +36,7 @@ class Entity:
     def build_param(self, writer: Writer, param: Parameter, suffix: str = ';'):
         if param.desc:
             line_comment(writer, param.desc)
-        writer.line(f"parameter {param.id} = {param.default}{suffix}")
+        writer.line(f"{'localparam' if param.local else 'parameter'} {param.id} = {param.default}{suffix}")
     
     def build_var(self, writer: Writer, var: GenVar|Integer, typ: str):
         if var.desc:
@@ -56,6 +58,8 @@ class Entity:
         writer.write(f" {signal.id}")
         if not (signal.count.typ == "const" and signal.count.args == 1):
             writer.write(f"[{signal.count.build(self.vars)}]")
+        if type(signal) is Signal and signal.init is not None and not is_port:
+            writer.write(f" = {self.widths.sized(signal.init, self.widths.target(signal.id)).build(self.vars)}")
         writer.line(suffix)
     
     def build_block(self, writer: Writer, stmt, assign: str):
@@ -64,7 +68,7 @@ class Entity:
         elif type(stmt) is Integer:
             self.build_var(writer, stmt, "integer")
         elif type(stmt) is Assign:
-            writer.line(assign.format(stmt.var, stmt.val.build(self.vars)))
+            writer.line(assign.format(stmt.var, self.widths.sized(stmt.val, self.widths.target(stmt.var)).build(self.vars)))
         elif type(stmt) is For:
             writer.line(f"for ({stmt.init.build(self.vars)}; {stmt.cond.build(self.vars)}; {stmt.inc.build(self.vars)}) begin")
             writer.pushIndent()
@@ -98,6 +102,8 @@ class Entity:
                     self.build_block(writer, elem, assign)
                 writer.popIndent()
             writer.line("end")
+        elif type(stmt) is Instance:
+            self.build_instance(writer, stmt)
         elif callable(stmt):
             stmt(self.vars, writer)
         else:
@@ -113,7 +119,7 @@ class Entity:
         elif type(stmt) is Integer:
             self.build_var(writer, stmt, "integer")
         elif type(stmt) is Assign:
-            writer.line(f"assign {self.vars[stmt.var]} = {stmt.val.build(self.vars)};")
+            writer.line(f"assign {self.vars[stmt.var]} = {self.widths.sized(stmt.val, self.widths.target(stmt.var)).build(self.vars)};")
         elif type(stmt) is Block:
             if stmt.clock:
                 writer.line(f"always @(posedge {self.vars[stmt.clock]}) begin")
@@ -135,36 +141,39 @@ class Entity:
             writer.popIndent()
             writer.line("endgenerate")
         elif type(stmt) is Instance:
-            writer.write(stmt.typ)
-            if stmt.params:
-                writer.line("#(")
-                writer.pushIndent()
-                keys = list(stmt.params.keys())
-                for i in range(len(keys)):
-                    k = keys[i]
-                    v = stmt.params[k]
-                    writer.write(f".{k}({v if type(v) is str else v.build(self.vars)})")
-                    if i < len(stmt.params) - 1:
-                        writer.write(",")
-                    writer.newline()
-                writer.popIndent()
-                writer.write(")")
-            writer.line(f" {stmt.id} (")
+            self.build_instance(writer, stmt)
+        elif callable(stmt):
+            stmt(self.vars, writer)
+        else:
+            raise ValueError(f"Cannot build {type(stmt)} in entity body")
+    
+    def build_instance(self, writer: Writer, stmt: Instance):
+        writer.write(stmt.typ)
+        if stmt.params:
+            writer.line("#(")
             writer.pushIndent()
-            keys = list(stmt.signals.keys())
+            keys = list(stmt.params.keys())
             for i in range(len(keys)):
                 k = keys[i]
-                v = stmt.signals[k]
+                v = stmt.params[k]
                 writer.write(f".{k}({v if type(v) is str else v.build(self.vars)})")
-                if i < len(stmt.signals) - 1:
+                if i < len(stmt.params) - 1:
                     writer.write(",")
                 writer.newline()
             writer.popIndent()
-            writer.line(");")
-        elif callable(stmt):
-            stmt(self.vars, writer)
-        else:
-            raise ValueError(f"Cannot build {type(stmt)} in entity body")
+            writer.write(")")
+        writer.line(f" {stmt.id} (")
+        writer.pushIndent()
+        keys = list(stmt.signals.keys())
+        for i in range(len(keys)):
+            k = keys[i]
+            v = stmt.signals[k]
+            writer.write(f".{k}({v if type(v) is str else self.widths.sized(v).build(self.vars)})")
+            if i < len(stmt.signals) - 1:
+                writer.write(",")
+            writer.newline()
+        writer.popIndent()
+        writer.line(");")
     
     def build(self, writer: Writer):
         # Start of definition.
@@ -209,7 +218,7 @@ def line_comment(writer: Writer, text: str):
 
 def build_intf(writer: Writer, bus: AsymmetricBus, map: dict):
     if bus.clk.typ == "bus_clock":
-        clock = [Signal(bus.clk.sigid, None, Span.default(), Expression("const", 0), "input")]
+        clock = [Signal(bus.clk.sigid, None, Span.default(), Expression("const", 1), Expression("const", 0), "input")]
     else:
         clock = []
     
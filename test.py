@@ -1,5 +1,221 @@
 #!/usr/bin/env python3
 
-import bustool
+import bustool, startup, sys, io, os, glob, shutil, subprocess, tempfile
+import parser, latency, model, estimate
+import widths, writer, testbench
 
-bustool.run("-", "test/bus.yml")
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def load(*ids):
+    """The test bus definitions, with `ids` generated."""
+    map = parser.parse_file("test/bus.yml")
+    for id in ids:
+        map[id].generate()
+    return map
+
+def test_fold():
+    width = parser.Expression("var", "width")
+    assert parser.span_width(parser.Span(width)) is width
+    assert parser.fold(parser.Expression.parse({"$sub": [{"$add": [3, "width"]}, 3]})).build({"width": "width"}) == "width"
+    assert parser.fold(parser.Expression.parse({"$mul": [{"$add": [1, 2]}, 4]})).args == 12
+    assert [parser.Expression.parse({"$clog2": [x]}).eval() for x in [0, 1, 2, 3, 4, 5]] == [0, 0, 1, 2, 2, 3]
+
+def test_decode():
+    # The minimal decode must agree with the exact one on every mapped address and never select two devices.
+    E = parser.MapEntry
+    maps = [([E(0b000, 0b011), E(0b101, 0b101), E(0b010, 0b110)], 3)]
+    map  = load("mux_d")
+    mux  = map["mux_d"]
+    maps.append((mux.static_map, 8))
+    for entries, width in maps:
+        minimal = parser.compile_static_map(entries, width, False)
+        for addr in range(1 << width):
+            exact = [i for i, ent in enumerate(entries) if addr & ent.mask == ent.addr]
+            sel   = [i for i, terms in enumerate(minimal) if any(addr & mask == value for mask, value in terms)]
+            assert len(sel) <= 1 and (not exact or sel == exact), (addr, sel, exact)
+    try:
+        latency.chain_params(map, ["mux_d"], {mux.dev_count: 4})
+        assert False, "static map device count overridden"
+    except ValueError:
+        pass
+
+def test_widths():
+    # Separately built copies of one expression share cache entries.
+    map    = load("mux_a")
+    mux    = map["mux_a"]
+    infer  = widths.Widths(mux.params, mux.signals, mux.body)
+    params = latency.chain_params(map, ["mux_a"], {"width": 16})
+    expr   = lambda: parser.Expression.parse({"$add": ["cpu.wdata", 1]})
+    assert infer.eval(expr(), params) == 17
+    symbolic = len(infer.symbolic)
+    assert infer.eval(expr(), params) == 17 and len(infer.symbolic) == symbolic
+    assert len(infer.cache[tuple(sorted(params.items()))]) == 1
+    assert infer.eval(parser.Expression.parse({"$slice": ["cpu.addr", 7, 4]}), params) == 4
+    assert infer.eval(parser.Expression.parse({"$eq": ["cpu.addr", 3]}), params) == 1
+
+def test_estimate():
+    # The lane select of an upsizing converter is a variable shift: 4 byte lanes into an 8-bit port.
+    map = load("conv_a", "mux_c")
+    assert estimate.estimate(map, "conv_a").mux_inputs == 32
+    wide = estimate.sweep(map, "mux_c", [{"peris": 2}, {"peris": 8}])
+    assert wide[0].mux_inputs < wide[1].mux_inputs, wide
+    # Counters are signals of the IR, so their registers are counted.
+    map = load("conv_a", "mux_c", "conv_c", "bridge_c")
+    for id, counters in [("conv_c", ["beat", "ret_beat"]), ("bridge_c", ["dev_inflight"])]:
+        est = estimate.Estimator(map[id])
+        assert all(est.widths.eval(parser.Expression(x), {}) for x in counters), id
+    try:
+        estimate.estimate(map, "mux_c", {"mems": 32})
+        assert False, "unknown parameter accepted"
+    except ValueError:
+        pass
+
+def test_estimate_all():
+    # Every generated entity can be estimated, including 1-bit pipelines of FIFO tree selectors and converters.
+    map = parser.parse_file("test/bus.yml")
+    ids = [id for id in map if isinstance(map[id], parser.ActiveEntity)]
+    for id in ids:
+        map[id].generate()
+        assert estimate.estimate(map, id).ff > 0, id
+    assert estimate.estimate(map, "mux_f", {"peris": 16}).ff > estimate.estimate(map, "mux_f").ff
+    try:
+        estimate.estimate(map, "bus_a")
+        assert False, "bus estimated"
+    except ValueError:
+        pass
+
+def test_latency():
+    # Tree selectors add a stage every two levels once there are more than eight devices; FIFO mode adds one cycle.
+    map = load("mux_b", "mux_c", "conv_c")
+    assert latency.chain_latency(map, ["mux_b"])["rdata"] == [2, 0]
+    assert latency.chain_latency(map, ["mux_b"], {"mems": 16})["rdata"] == [2, 2]
+    assert latency.chain_latency(map, ["mux_c", "conv_c"])["rdata"] == [1, 1, 1]
+
+def test_bridge():
+    # Both crossings take one cycle for the FIFO write plus two synchronizer stages.
+    lat = latency.chain_latency(load("bridge_c"), ["bridge_c"])
+    assert lat["rdata"] == [1, 6], lat
+    # Responses during a stall still enter the FIFO, or their in-flight slots would never be freed.
+    bridge = load("bridge_e")["bridge_e"]
+    push   = [x for x in bridge.body if type(x) is parser.Assign and x.var == "resp_push"][0]
+    assert push.val.typ == "raw" and push.val.args == "peri.rvalid", push.val
+
+def instances(body):
+    """Every instance in `body`, including those in generate blocks."""
+    for stmt in body:
+        if type(stmt) is parser.Instance:
+            yield stmt
+        elif type(stmt) in [parser.GenBlock, parser.Block, parser.For]:
+            yield from instances(stmt.body)
+        elif type(stmt) is parser.If:
+            yield from instances(stmt.body + [x for _, body in stmt.b_elif for x in body] + (stmt.b_else or []))
+
+def test_stall():
+    # Device 0 stalls half the time; returns already in flight from device 1 must not wait for it.
+    map = load("mux_b")
+    for inst in instances(map["mux_b"].body):
+        assert "en" not in inst.signals, inst.id
+    sim = model.MuxModel(map["mux_b"], map, devices=[model.DeviceModel(stall=0.5), model.DeviceModel()], batch=8, seed=1)
+    res = sim.run(*sim.random_traffic(1000))
+    assert res.stalls and res.held, res
+    assert 0 <= res.accepted - res.responses <= 8 * sim.depth, res
+
+def test_skid():
+    # Devices refusing half the requests fill the skid buffer; the controller only sees whether it is empty.
+    map = load("mux_e")
+    mux = map["mux_e"]
+    skid = [x for x in instances(mux.body) if x.id == "skid_req"][0]
+    assert skid.signals["en"].args == "peri_issue" and skid.signals["ready"].args == "peri_ready"
+    sim = model.MuxModel(mux, map, devices=[model.DeviceModel(refuse=0.5), model.DeviceModel(refuse=0.5)], batch=8, seed=1)
+    res = sim.run(*sim.random_traffic(1000))
+    assert 0.4 < res.throughput() < 0.9, res
+    assert 0 <= res.accepted - res.responses <= 8 * (mux.fifo_depth + 1), res
+
+def test_converter():
+    # Upsizing cannot write part of a word, and every controller address must reach the device.
+    map = load("conv_a", "conv_c")
+    assert map["conv_c"].downsize and map["conv_c"].ratio == 4
+    assert not map["conv_a"].downsize and map["conv_a"].times["rdata"].args == 2
+    bad = [
+        {"bus": "bus_a", "ctl_params": {"width": 8}, "dev_params": {"width": 32}},
+        {"bus": "bus_c", "ctl_params": {"width": 64}, "dev_params": {"width": 16}},
+        {"bus": "bus_c", "ctl_params": {"width": 16, "addr_width": 12}, "dev_params": {"width": 64, "addr_width": 8}},
+    ]
+    for raw in bad:
+        conv = parser.WidthConverter.parse("conv", raw)
+        try:
+            conv.analyze(map)
+            assert False, raw
+        except ValueError:
+            pass
+    # Stalls only hold back requests; returns already in flight keep moving.
+    map = load("conv_b", "conv_e")
+    for id in ["conv_b", "conv_e"]:
+        for inst in instances(map[id].body):
+            assert "en" not in inst.signals, (id, inst.id)
+    assert map["conv_e"].valid.args == "peri.rvalid", map["conv_e"].valid
+
+def test_testbench():
+    # Returned data is checked per signal: along a pipeline for fixed latency, against a queue for response buses.
+    for id, check in [("mux_b", "chk_rdata && ctl.rdata != exp_rdata"), ("mux_c", "exp_rdata.pop_front()")]:
+        map = load(id)
+        out = io.StringIO()
+        testbench.build(writer.Writer(out), map, id)
+        assert check in out.getvalue() and "errors=%0d" in out.getvalue(), id
+
+def test_lint():
+    # The generated code and testbenches must elaborate on the local open-source simulators, where installed.
+    tools = [
+        ["iverilog", "-g2012", "-o", os.devnull],
+        ["verilator", "--lint-only", "--timing", "-Wno-fatal", "-Wno-MULTITOP"],
+    ]
+    tools = [x for x in tools if shutil.which(x[0])]
+    if not tools:
+        print("No SystemVerilog simulator found, skipping lint", file=sys.stderr)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "bus.sv")
+        bustool.run(out, "test/bus.yml", True)
+        for tool in tools:
+            subprocess.run(tool + sorted(glob.glob("sv/*.sv")) + [out], check=True)
+
+def test_simulate_kind():
+    # Only multiplexers have a model.
+    map = load("conv_a")
+    try:
+        model.MuxModel(map["conv_a"], map)
+        assert False, "converter simulated"
+    except ValueError as e:
+        assert "not a multiplexer" in str(e), e
+
+def test_fifo_mux():
+    # Requests alternate between a slow and a fast device; neither waits for the other.
+    map = load("mux_c")
+    sim = model.MuxModel(map["mux_c"], map, devices=[model.DeviceModel(jitter=3), model.DeviceModel()], batch=8, seed=1)
+    res = sim.run(*sim.random_traffic(1000))
+    assert res.throughput() > 0.95, res
+    assert 0 <= res.accepted - res.responses <= 8 * sim.mux.fifo_depth, res
+
+bustool.run("-", "test/bus.yml", True)
+test_fold()
+test_decode()
+test_widths()
+test_estimate()
+test_estimate_all()
+test_latency()
+test_bridge()
+test_simulate_kind()
+test_testbench()
+test_lint()
+test_converter()
+if numpy:
+    test_stall()
+    test_skid()
+    test_fifo_mux()
+
+over = startup.check()
+if over:
+    sys.exit("Over the startup budget: " + ", ".join(over))
@@ -0,0 +1,236 @@
+
+from parser import *
+from writer import *
+from sysverilog import Entity
+
+
+def _bus_instance(bus: AsymmetricBus, id: str) -> Instance:
+    """Instance of the bus interface with the testbench's parameters."""
+    return Instance(bus.id, id, None, {param.id: param.id for param in bus.params}, {bus.clk.sigid: "clk"} if bus.clk.typ == "bus_clock" else {})
+
+
+def _delay(wr: Writer, name: str, span: str, depth: str, value: str):
+    """
+    Signal `name` carrying `value` delayed by `depth` cycles, a parameter that may be zero.
+    The stages are written by a single always block; simulators disagree on arrays that are partly driven by an assign.
+    """
+    wr.line(f"logic{span} {name};")
+    wr.line(f"if ({depth} == 0) begin")
+    wr.pushIndent()
+    wr.line(f"assign {name} = {value};")
+    wr.popIndent()
+    wr.line("end else begin")
+    wr.pushIndent()
+    wr.line(f"logic{span} stage[{depth}];")
+    wr.line("always @(posedge clk) begin")
+    wr.pushIndent()
+    wr.line(f"stage[0] <= {value};")
+    wr.line(f"for (int i = 1; i < {depth}; i = i + 1) stage[i] <= stage[i-1];")
+    wr.popIndent()
+    wr.line("end")
+    wr.line(f"assign {name} = stage[{depth}-1];")
+    wr.popIndent()
+    wr.line("end")
+
+def device_model(wr: Writer, bus: AsymmetricBus, vars: dict, ref: str, times: dict[str, Expression]):
+    """
+    Device that answers every accepted request, each return signal `time` cycles later.
+    Stall and accept signals are randomised with `stall_rate`; they only hold back new requests.
+    Returned data is the request's address plus one, so a zero never passes for a response.
+    """
+    controls = bus.controls()
+    request  = bus.accepted(ref).build(vars)
+    for sig in bus.signals:
+        if sig.dir != "input": continue
+        if sig.id in controls:
+            # Asserting a stall signal or clearing an accept signal holds the controller back.
+            cond = "<" if sig.id in bus.trans.stall.vars else ">="
+            wr.line(f"always @(posedge clk) {ref}.{sig.id} <= $urandom_range(99) {cond} stall_rate;")
+            continue
+        span = "" if sig.span.is_default() else sig.span.build(vars)
+        wr.line(f"localparam integer t_{sig.id} = {times[sig.id].build(vars)};")
+        _delay(wr, f"pend_{sig.id}", "", f"t_{sig.id}", request)
+        if bus.trans.response and sig.id in bus.trans.response.vars:
+            wr.line(f"assign {ref}.{sig.id} = pend_{sig.id};")
+            continue
+        _delay(wr, f"data_{sig.id}", span, f"t_{sig.id}", _expected(bus, ref))
+        wr.line(f"assign {ref}.{sig.id} = pend_{sig.id} ? data_{sig.id} : '0;")
+
+def _expected(bus: AsymmetricBus, ref: str) -> str:
+    """Data the device model returns for the request on `ref`."""
+    return f"{ref}.{bus.addr} + 1" if bus.addr else "'1"
+
+def controller_model(wr: Writer, bus: AsymmetricBus, vars: dict, ref: str, name: str, times: dict[str, Expression], addr):
+    """
+    Controller issuing random requests at `rate` percent of the cycles, holding them until accepted.
+    Counts accepted requests, stall cycles, request-to-response latency and returned data that does not match the request,
+    and prints them as one line of NAME=VALUE pairs.
+    """
+    request  = bus.port_expr(bus.trans.request, ref).build(vars)
+    accepted = bus.accepted(ref).build(vars)
+    stall    = bus.port_expr(bus.trans.stall, ref).build(vars)
+    controls = bus.controls() + (list(bus.trans.response.vars) if bus.trans.response else [])
+    data     = [sig for sig in bus.signals if sig.dir == "input" and sig.id not in controls]
+    wr.line("longint cycle = 0, accepted = 0, responses = 0, stalls = 0, lat_total = 0, errors = 0;")
+    wr.line("longint issued[$];")
+    wr.line(f"wire accept_now = {accepted};")
+    
+    # Expected data: queued until the response, or carried along a pipeline as long as each signal's return time.
+    for sig in data:
+        span = "" if sig.span.is_default() else sig.span.build(vars)
+        if bus.trans.response:
+            wr.line(f"logic{span} exp_{sig.id}[$];")
+            continue
+        wr.line(f"localparam integer t_chk_{sig.id} = {times[sig.id].build(vars)};")
+        _delay(wr, f"chk_{sig.id}", "", f"t_chk_{sig.id}", "accept_now")
+        _delay(wr, f"exp_{sig.id}", span, f"t_chk_{sig.id}", _expected(bus, ref))
+    
+    # Response detection: the bus's response signal, or the fixed return time.
+    if bus.trans.response:
+        wr.line(f"wire resp = {bus.port_expr(bus.trans.response, ref).build(vars)};")
+    else:
+        wr.line(f"localparam integer t_resp = {_resp_time(bus, times).build(vars)};")
+        _delay(wr, "resp", "", "t_resp", "accept_now")
+    
+    wr.line("always @(posedge clk) begin")
+    wr.pushIndent()
+    wr.line("cycle <= cycle + 1;")
+    wr.line(f"if ({stall}) stalls <= stalls + 1;")
+    wr.line("if (accept_now) begin")
+    wr.pushIndent()
+    wr.line("accepted <= accepted + 1;")
+    wr.line("issued.push_back(cycle);")
+    if bus.trans.response:
+        for sig in data:
+            wr.line(f"exp_{sig.id}.push_back({_expected(bus, ref)});")
+    wr.popIndent()
+    wr.line("end")
+    wr.line("if (resp && issued.size()) begin")
+    wr.pushIndent()
+    wr.line("responses <= responses + 1;")
+    wr.line("lat_total <= lat_total + cycle - issued.pop_front();")
+    if bus.trans.response and data:
+        wr.line("errors <= errors + " + " + ".join(f"({ref}.{sig.id} != exp_{sig.id}.pop_front())" for sig in data) + ";")
+    wr.popIndent()
+    wr.line("end")
+    if not bus.trans.response and data:
+        wr.line("errors <= errors + " + " + ".join(f"(chk_{sig.id} && {ref}.{sig.id} != exp_{sig.id})" for sig in data) + ";")
+    # New traffic once the previous request was accepted.
+    wr.line(f"if (!{request} || accept_now) begin")
+    wr.pushIndent()
+    for sig in bus.signals:
+        if sig.dir != "output": continue
+        if sig.id in bus.trans.request.vars:
+            wr.line(f"{ref}.{sig.id} <= $urandom_range(99) < rate;")
+        elif sig.id == bus.addr:
+            wr.line(f"{ref}.{sig.id} <= {addr};")
+        else:
+            wr.line(f"{ref}.{sig.id} <= $urandom;")
+    wr.popIndent()
+    wr.line("end")
+    wr.line("if (cycle == cycles) begin")
+    wr.pushIndent()
+    wr.line(f'$display("PERF name={name} cycles=%0d accepted=%0d responses=%0d stalls=%0d errors=%0d throughput=%0f avg_latency=%0f",')
+    wr.line("    cycle, accepted, responses, stalls, errors, $itor(accepted) / cycle, responses ? $itor(lat_total) / responses : 0.0);")
+    wr.line("$finish;")
+    wr.popIndent()
+    wr.line("end")
+    wr.popIndent()
+    wr.line("end")
+
+
+def _tb_params(bus: AsymmetricBus, extra: list[Parameter]) -> list[Parameter]:
+    return bus.params + extra + [
+        Parameter("cycles",     "Number of cycles to simulate.", Expression("const", 10000)),
+        Parameter("rate",       "Chance of a new request each cycle, in percent.", Expression("const", 100)),
+        Parameter("stall_rate", "Chance of a device stalling or refusing each cycle, in percent.", Expression("const", 0))
+    ]
+
+def _clock(vars: dict, wr: Writer):
+    wr.line("logic clk = 0;")
+    wr.line("always #5 clk = !clk;")
+
+def build_intf_tb(writer: Writer, bus: AsymmetricBus, map: dict):
+    """Controller and device model connected back to back on one bus."""
+    params = _tb_params(bus, [])
+    vars   = {param.id: param.id for param in params}
+    times  = {sig.id: sig.time for sig in bus.signals}
+    Entity("module", f"{bus.id}_tb", f"Throughput testbench for {bus.id}.", params, [], [
+        _clock,
+        _bus_instance(bus, "bus"),
+        lambda v, wr: device_model(wr, bus, vars, "bus", times),
+        lambda v, wr: controller_model(wr, bus, vars, "bus", bus.id, times, "$urandom")
+    ]).build(writer)
+
+def _resp_time(bus: AsymmetricBus, times: dict[str, Expression]) -> Expression:
+    """Return time of the slowest data signal."""
+    controls = bus.controls()
+    data     = [sig for sig in bus.signals if sig.dir == "input" and sig.id not in controls]
+    if not data:
+        return Expression("const", 0)
+    res = times[data[0].id]
+    for sig in data[1:]:
+        res = Expression("$if", [Expression("$gt", [times[sig.id], res]), times[sig.id], res])
+    return res
+
+def build_mux_tb(writer: Writer, mux: BusMux, map: dict):
+    """Controller model driving the multiplexer, with a device model on every device port."""
+    bus    = mux.bus
+    params = _tb_params(bus, [x for x in mux.params])
+    vars   = {param.id: param.id for param in params}
+    awidth = mux.addr_width()
+    dev_times = {sig.id: sig.time for sig in bus.signals}
+    body   = [_clock, GenVar("x")]
+    body.append(_bus_instance(bus, "ctl"))
+    body.append(_bus_instance(bus, f"dev[{mux.dev_count}]"))
+    
+    # Address map: the static map, or the address space split evenly on the top bits.
+    def addr_map(v, wr: Writer):
+        wr.line(f"logic[{awidth-1}:0] map_addr[{mux.dev_count}];")
+        wr.line(f"logic[{awidth-1}:0] map_mask[{mux.dev_count}];")
+        if mux.static_map:
+            for i in range(len(mux.static_map)):
+                wr.line(f"assign map_addr[{i}] = {awidth}'h{mux.static_map[i].addr:x};")
+                wr.line(f"assign map_mask[{i}] = {awidth}'h{mux.static_map[i].mask:x};")
+        else:
+            wr.line(f"localparam integer map_bits = {mux.dev_count} > 1 ? $clog2({mux.dev_count}) : 1;")
+            wr.line(f"for (x = 0; x < {mux.dev_count}; x = x + 1) begin")
+            wr.pushIndent()
+            wr.line(f"assign map_addr[x] = x << ({awidth} - map_bits);")
+            wr.line(f"assign map_mask[x] = ((1 << map_bits) - 1) << ({awidth} - map_bits);")
+            wr.popIndent()
+            wr.line("end")
+    body.append(addr_map)
+    
+    conns = {}
+    if bus.clk.typ == "ext_clock":
+        conns[bus.clk.sigid] = "clk"
+    conns[mux.ctl_port] = "ctl"
+    conns[mux.dev_port] = "dev"
+    if not mux.static_map:
+        conns["map_addr"] = "map_addr"
+        conns["map_mask"] = "map_mask"
+    body.append(Instance(mux.id, "dut", None, {param.id: param.id for param in mux.params if not param.local}, conns))
+    
+    def devices(v, wr: Writer):
+        wr.line(f"for (x = 0; x < {mux.dev_count}; x = x + 1) begin : device")
+        wr.pushIndent()
+        device_model(wr, bus, vars, "dev[x]", dev_times)
+        wr.popIndent()
+        wr.line("end")
+    body.append(devices)
+    
+    # Pick a device, then a random address inside its range.
+    def controller(v, wr: Writer):
+        wr.line("int target;")
+        wr.line(f"always @(posedge clk) target <= $urandom_range({mux.dev_count} - 1);")
+        controller_model(wr, bus, vars, "ctl", mux.id, mux.timing(), "map_addr[target] | ($urandom & ~map_mask[target])")
+    body.append(controller)
+    
+    Entity("module", f"{mux.id}_tb", f"Throughput testbench for {mux.id}.", params, [], body).build(writer)
+
+def build(writer: Writer, map: dict, id: str):
+    if type(map[id]) is AsymmetricBus:
+        build_intf_tb(writer, map[id], map)
+    elif type(map[id]) is BusMux:
+        build_mux_tb(writer, map[id], map)
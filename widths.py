@@ -0,0 +1,175 @@
+
+from parser import *
+import re
+
+
+def const_width(value: int) -> int:
+    return max(1, int(value).bit_length())
+
+
+# Operators whose result is a single bit.
+_logical  = ["$not", "$and", "$or", "$gt", "$lt", "$ge", "$le", "$eq", "$ne"]
+# Operators whose operands are extended to a common width.
+_balanced = ["$andb", "$orb", "$xorb", "$add", "$sub", "$eq", "$ne", "$gt", "$lt", "$ge", "$le"]
+
+def _key(expr: Expression) -> tuple:
+    """Structural identity of `expr`, so equal expressions built separately share cache entries."""
+    if type(expr.typ) is Operator:
+        return ("$" + expr.typ.name, tuple(_key(x) for x in expr.args))
+    return (expr.typ, expr.args)
+
+_sized_re = re.compile(r"^(\d+)'[sS]?[bBoOdDhH][0-9a-fA-F_xXzZ]+$")
+_index_re = re.compile(r"\[[^\]]*\]")
+
+
+class Widths:
+    """
+    Bit-width inference for the expressions in one entity.
+    Widths are kept as expressions over the entity's parameters so they can be emitted;
+    `eval` resolves them for one set of parameter values and caches the result per set.
+    Both caches are keyed by the structure of the expression, not its identity.
+    The emitter only uses the widths to size constant literals through `sized`;
+    other operands keep their declared widths and are never cast or truncated.
+    """
+    def __init__(self, params: list[Parameter], signals: list, body: list = []):
+        self.params   = {param.id for param in params}
+        self.env      = {}
+        self.symbolic = {}
+        self.cache    = {}
+        for sig in signals + body:
+            if type(sig) is Signal:
+                self.env[sig.id] = (span_width(sig.span), fold(sig.count))
+            elif type(sig) is BusInstance:
+                for sub in sig.bus.signals:
+                    self.env[f"{sig.id}.{sub.id}"] = (span_width(sub.span), fold(sub.count))
+                self.params |= {f"{sig.id}.{param.id}" for param in sig.bus.params}
+    
+    def lookup(self, name: str) -> tuple[Expression, Expression]|None:
+        """Width and count of a signal referenced by name, with array indices stripped."""
+        name = _index_re.sub("", name)
+        return self.env[name] if name in self.env else None
+    
+    def target(self, name: str) -> Expression|None:
+        """Width of an assignment target."""
+        match = re.match(r"^(.*)\[([^\]:]*)\]$", name)
+        if match and not self.is_array(Expression(match.group(1))):
+            return Expression("const", 1)
+        return self.width(Expression(name))
+    
+    def is_array(self, expr: Expression) -> bool:
+        if expr.typ not in ["var", "raw"] or type(expr.args) is not str:
+            return False
+        ent = self.lookup(expr.args)
+        return ent is not None and not (ent[1].typ == "const" and ent[1].args == 1)
+    
+    def width(self, expr: Expression) -> Expression|None:
+        """Width of `expr` in bits as an expression, None if it cannot be determined."""
+        key = _key(expr)
+        if key not in self.symbolic:
+            res = self._width(expr)
+            self.symbolic[key] = fold(res) if res else None
+        return self.symbolic[key]
+    
+    def _width(self, expr: Expression) -> Expression|None:
+        if expr.typ == "const":
+            return Expression("const", const_width(expr.args))
+        elif expr.typ in ["var", "raw"]:
+            if type(expr.args) is not str:
+                return None
+            if expr.args in self.params:
+                # Untyped parameters are 32-bit integers.
+                return Expression("const", 32)
+            match = _sized_re.match(expr.args)
+            if match:
+                return Expression("const", int(match.group(1)))
+            ent = self.lookup(expr.args)
+            return ent[0] if ent else None
+        elif type(expr.typ) is not Operator:
+            return None
+        
+        key  = "$" + expr.typ.name
+        args = [self.width(x) for x in expr.args]
+        if key in _logical:
+            return Expression("const", 1)
+        elif key == "$index":
+            return args[0] if self.is_array(expr.args[0]) else Expression("const", 1)
+        elif key == "$slice":
+            return fold(Expression("$add", [Expression("$sub", [expr.args[1], expr.args[2]]), Expression("const", 1)]))
+        elif key == "$clog2":
+            return Expression("const", 32)
+        elif None in args:
+            return None
+        elif key in ["$notb", "$shl", "$shr", "$div", "$set"]:
+            return args[0]
+        elif key == "$mod":
+            return args[1]
+        elif key in ["$andb", "$orb", "$xorb", "$sub"]:
+            return self.max(args)
+        elif key == "$add":
+            return Expression("$add", [self.max(args), Expression("const", 1)])
+        elif key == "$sum":
+            return Expression("$add", [self.max(args), Expression("$clog2", [Expression("const", len(args))])])
+        elif key in ["$mul", "$prod"]:
+            res = args[0]
+            for x in args[1:]:
+                res = Expression("$add", [res, x])
+            return res
+        elif key == "$if":
+            return self.max(args[1:])
+        return None
+    
+    @staticmethod
+    def max(args: list[Expression]) -> Expression:
+        res = args[0]
+        for x in args[1:]:
+            res = Expression("$if", [Expression("$gt", [x, res]), x, res])
+        return fold(res)
+    
+    def eval(self, expr: Expression, params: dict) -> int|None:
+        """Width of `expr` in bits for the given parameter values."""
+        key = tuple(sorted(params.items()))
+        if key not in self.cache:
+            self.cache[key] = {}
+        cache = self.cache[key]
+        expr_key = _key(expr)
+        if expr_key not in cache:
+            width = self.width(expr)
+            cache[expr_key] = width.compile()(params) if width else None
+        return cache[expr_key]
+    
+    def sized(self, expr: Expression, width: Expression = None) -> Expression:
+        """
+        Copy of `expr` with constant operands written as literals of the width they are used at.
+        `width` is the width of the context `expr` itself is assigned to, if known.
+        """
+        if expr.typ == "const":
+            return self.literal(expr.args, width)
+        elif type(expr.typ) is not Operator:
+            return expr
+        key  = "$" + expr.typ.name
+        args = list(expr.args)
+        if key in _balanced or key == "$if":
+            ops = args[1:] if key == "$if" else args
+            if key in _logical or width is None:
+                # Constants take the width of the other operands.
+                known = [self.width(x) for x in ops if x.typ != "const"]
+                width = self.max(known) if known and None not in known else None
+            offset = 1 if key == "$if" else 0
+            for i in range(len(ops)):
+                args[i + offset] = self.sized(ops[i], width)
+            if key == "$if":
+                args[0] = self.sized(args[0])
+        else:
+            args = [x if x.typ == "const" else self.sized(x) for x in args]
+        return Expression(expr.typ, args)
+    
+    @staticmethod
+    def literal(value: int, width: Expression|None) -> Expression:
+        if value < 0:
+            return Expression("const", value)
+        elif width is not None and width.typ == "const" and const_width(value) <= width.args:
+            return Expression(f"{width.args}'d{value}")
+        elif value == 0:
+            # Fills whatever width the context has.
+            return Expression("'0")
+        return Expression("const", value)